@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+📦 Action Batcher - объединение совместимых действий в один вызов Claude
+"""
+
+import re
+
+# Проактивные действия для разных людей можно делать одним вызовом
+PROACTIVE_ACTIONS = {'proactive_message', 'proactive_care'}
+# Лёгкие фоновые задачи, которые можно подцепить к проверке сообщений
+CHEAP_BACKGROUND = {'prepare_content'}
+# Больше задач в одном промпте - выше риск, что ответ смешается
+DEFAULT_MAX_BATCH = 4
+
+RESULT_MARKER = re.compile(r'^=== RESULT (\d+) ===\s*$', re.MULTILINE)
+
+
+class ActionBatcher:
+    """Группирует действия и собирает из них один структурированный промпт"""
+
+    def __init__(self, max_batch=DEFAULT_MAX_BATCH):
+        self.max_batch = max_batch
+
+    def is_cheap(self, decision):
+        return decision['action'] in CHEAP_BACKGROUND
+
+    def coalesce(self, decisions):
+        """Разбивает очередь на пачки совместимых действий (порядок сохраняется)"""
+        batches = []
+        proactive = None
+        messages = None
+
+        for decision in decisions:
+            action = decision['action']
+
+            if decision.get('no_batch'):
+                batches.append([decision])
+            elif action in PROACTIVE_ACTIONS:
+                if proactive is None or len(proactive) >= self.max_batch:
+                    proactive = [decision]
+                    batches.append(proactive)
+                else:
+                    proactive.append(decision)
+            elif action == 'check_messages':
+                messages = [decision]
+                batches.append(messages)
+            elif action in CHEAP_BACKGROUND and messages is not None and len(messages) == 1:
+                # Одна лёгкая задача едет вместе с проверкой сообщений
+                messages.append(decision)
+            else:
+                batches.append([decision])
+
+        return batches
+
+    def build_prompt(self, commands):
+        """Собирает промпты нескольких действий в один"""
+        parts = [
+            f"Выполни {len(commands)} независимых задач по очереди.",
+            "Ответ по каждой задаче начни отдельной строкой `=== RESULT <номер> ===`.",
+            "Не пропускай задачи, даже если по какой-то нечего делать - так и напиши.",
+            ""
+        ]
+        for index, command in enumerate(commands, 1):
+            parts.append(f"=== TASK {index} ===")
+            parts.append(command.strip())
+            parts.append("")
+        return "\n".join(parts)
+
+    def split_response(self, output, count):
+        """Разбирает ответ обратно по задачам: {номер: текст}"""
+        results = {}
+        matches = list(RESULT_MARKER.finditer(output or ''))
+        for i, match in enumerate(matches):
+            index = int(match.group(1))
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(output)
+            if 1 <= index <= count:
+                results[index] = output[match.end():end].strip()
+        return results
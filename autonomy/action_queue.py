@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+🎫 Action Queue - персистентная очередь действий с арендой и дедупликацией
+
+Живёт в той же SQLite базе, что и StateStore. Каждое действие имеет ключ
+дедупликации: пересекающиеся запуски из cron не выполнят его дважды, а
+действие упавшего процесса подхватится после истечения аренды.
+"""
+
+import json
+import os
+import socket
+import time
+
+# После стольких неудачных попыток действие снимается
+MAX_ATTEMPTS = 3
+# Выполненные записи храним для дедупликации не дольше (секунды)
+DONE_RETENTION = 2 * 24 * 3600
+
+
+def default_owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class ActionQueue:
+    def __init__(self, store, owner=None):
+        self.store = store
+        self.owner = owner or default_owner()
+        with store.lock:
+            store.conn.execute("""
+                CREATE TABLE IF NOT EXISTS action_queue (
+                    dedupe_key TEXT PRIMARY KEY,
+                    decision TEXT,
+                    status TEXT,
+                    lease_owner TEXT,
+                    lease_until REAL,
+                    expires_at REAL,
+                    attempts INTEGER DEFAULT 0,
+                    created_at REAL,
+                    finished_at REAL
+                )
+            """)
+            store.conn.execute(
+                "CREATE INDEX IF NOT EXISTS action_queue_status ON action_queue(status, created_at)"
+            )
+
+    def enqueue(self, key, decision, ttl):
+        """Ставит действие; True - поставлено (новое или перевзведённое)
+
+        Дедупликацию дают только выполненная запись и живая аренда. Снятое после
+        MAX_ATTEMPTS или истёкшее действие с тем же ключом (например, проверка
+        сообщений, которая так и не прошла и не сдвинула last_message_check)
+        получает новое окно попыток - иначе оно блокировало бы ключ до purge().
+        """
+        now = time.time()
+        with self.store.lock:
+            cursor = self.store.conn.execute(
+                "INSERT INTO action_queue "
+                "(dedupe_key, decision, status, expires_at, created_at) VALUES (?, ?, 'pending', ?, ?) "
+                "ON CONFLICT(dedupe_key) DO UPDATE SET "
+                "decision = excluded.decision, status = 'pending', attempts = 0, "
+                "lease_owner = NULL, lease_until = NULL, expires_at = excluded.expires_at "
+                "WHERE status = 'failed' OR (status != 'done' AND expires_at <= ?)",
+                (key, json.dumps(decision, default=str), now + ttl, now, now)
+            )
+        return cursor.rowcount == 1
+
+    def lease(self, lease_seconds, key=None):
+        """Берёт действие в аренду (конкретное или самое старое доступное)
+
+        lease_seconds - число или функция от имени действия. Попыткой считается
+        первая аренда и перехват аренды упавшего процесса; повторная аренда
+        своим же процессом (отложили, вытеснили) попыткой не считается.
+        Возвращает решение или None, если брать нечего: уже сделано, занято
+        другим процессом или истекло.
+        """
+        now = time.time()
+        with self.store.transaction():
+            sql = """
+                SELECT dedupe_key, decision FROM action_queue
+                WHERE expires_at > ?
+                  AND (status = 'pending'
+                       OR (status = 'leased' AND (lease_until < ? OR lease_owner = ?)))
+            """
+            args = [now, now, self.owner]
+            if key is not None:
+                sql += " AND dedupe_key = ?"
+                args.append(key)
+            sql += " ORDER BY created_at LIMIT 1"
+            row = self.store.conn.execute(sql, args).fetchone()
+            if row is None:
+                return None
+
+            decision = json.loads(row[1])
+            if callable(lease_seconds):
+                lease_seconds = lease_seconds(decision.get('action'))
+            self.store.conn.execute(
+                "UPDATE action_queue SET attempts = CASE "
+                "WHEN attempts = 0 OR (status = 'leased' AND lease_owner != ?) THEN attempts + 1 "
+                "ELSE attempts END, "
+                "status = 'leased', lease_owner = ?, lease_until = ? WHERE dedupe_key = ?",
+                (self.owner, self.owner, now + lease_seconds, row[0])
+            )
+        decision['dedupe_key'] = row[0]
+        return decision
+
+    def complete(self, key):
+        """Действие выполнено - больше не повторяем"""
+        with self.store.lock:
+            self.store.conn.execute(
+                "UPDATE action_queue SET status = 'done', finished_at = ?, lease_owner = NULL "
+                "WHERE dedupe_key = ?",
+                (time.time(), key)
+            )
+
+    def defer(self, key):
+        """Не дошло до выполнения (Claude занят) - вернуть в очередь, попыткой не считая"""
+        with self.store.lock:
+            self.store.conn.execute(
+                "UPDATE action_queue SET lease_owner = NULL, lease_until = NULL, status = 'pending' "
+                "WHERE dedupe_key = ? AND status = 'leased'",
+                (key,)
+            )
+
+    def release(self, key):
+        """Не получилось - вернуть в очередь (или снять после MAX_ATTEMPTS неудач)"""
+        with self.store.lock:
+            self.store.conn.execute(
+                "UPDATE action_queue SET lease_owner = NULL, lease_until = NULL, attempts = attempts + 1, "
+                "status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END "
+                "WHERE dedupe_key = ?",
+                (MAX_ATTEMPTS, key)
+            )
+
+    def purge(self):
+        """Удаляет старые выполненные и истёкшие записи"""
+        now = time.time()
+        with self.store.lock:
+            self.store.conn.execute(
+                "DELETE FROM action_queue WHERE (status IN ('done', 'failed') AND created_at < ?) "
+                "OR (status != 'done' AND expires_at < ?)",
+                (now - DONE_RETENTION, now - DONE_RETENTION)
+            )
+
+    def pending_count(self):
+        with self.store.lock:
+            row = self.store.conn.execute(
+                "SELECT COUNT(*) FROM action_queue WHERE status IN ('pending', 'leased') AND expires_at > ?",
+                (time.time(),)
+            ).fetchone()
+        return row[0]
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+📈 Adaptive Polling - интервал проверки сообщений по активности людей
+
+Сразу после активности проверяем раз в минуту, а в тишине интервал быстро
+удваивается: частый опрос держится лишь несколько минут разговора, поэтому
+вызовов выходит не больше, чем при фиксированных 5 минутах. Насколько далеко
+интервал уходит, решают личные гистограммы недавно писавших людей: в час, когда
+обычно кто-то из них пишет, он не растёт дальше 5 минут, в тихие - до 30.
+"""
+
+import math
+import threading
+from datetime import datetime
+
+# Сразу после сообщения проверяем часто (секунды) - разговор, скорее всего, продолжится
+FAST_INTERVAL = 60
+# Дальше интервал удваивается каждые BACKOFF_STEP секунд тишины: быстрый опрос
+# держится лишь несколько минут после активности
+BACKOFF_STEP = 120
+# В привычно активные часы тишина не растягивает интервал дальше этого
+ACTIVE_HOUR_INTERVAL = 300
+MAX_INTERVAL = 1800
+# Люди, молчащие дольше, на ожидаемую активность не влияют
+ACTIVE_USER_WINDOW = 7 * 24 * 3600
+# Затухание гистограммы на каждое новое сообщение: старые привычки забываются
+DECAY = 0.995
+# Меньше стольких сообщений - гистограмме не доверяем
+MIN_EVENTS = 10
+
+
+class ActivityModel:
+    """Гистограммы активности по часам: map 'activity_histogram' в StateStore"""
+
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+        self.histograms = store.get_map('activity_histogram')
+        self.overall = store.get('activity_overall', [0.0] * 24)
+        self.events = store.get('activity_events', 0)
+        self.last_activity = None
+
+    def record(self, user_id, when):
+        """Учитывает сообщение пользователя"""
+        user_id = str(user_id)
+        with self.lock:
+            histogram = self.histograms.get(user_id) or [0.0] * 24
+            histogram = [round(value * DECAY, 4) for value in histogram]
+            histogram[when.hour] += 1
+            self.histograms[user_id] = histogram
+
+            self.overall = [round(value * DECAY, 4) for value in self.overall]
+            self.overall[when.hour] += 1
+            self.events += 1
+
+            if self.last_activity is None or when > self.last_activity:
+                self.last_activity = when
+
+            self.store.set_map_item('activity_histogram', user_id, histogram)
+            self.store.update({'activity_overall': self.overall, 'activity_events': self.events})
+
+    def has_data(self):
+        return self.events >= MIN_EVENTS and self.last_activity is not None
+
+    def hour_likelihood(self, hour, user_id=None):
+        """Насколько этот час активен относительно самого активного (0..1)"""
+        histogram = self.histograms.get(str(user_id)) if user_id is not None else self.overall
+        if not histogram or max(histogram) <= 0:
+            return 0.0
+        return histogram[hour] / max(histogram)
+
+    def expected_activity(self, now, last_seen=None):
+        """Насколько вероятно, что в этот час напишет хоть кто-то (0..1)
+
+        last_seen - {user_id: время последнего сообщения (ISO)}; учитываются
+        личные привычки тех, кто писал за ACTIVE_USER_WINDOW. Без него -
+        общая гистограмма.
+        """
+        if last_seen is None:
+            return self.hour_likelihood(now.hour)
+
+        quiet = 1.0
+        for user_id, seen in last_seen.items():
+            if (now - datetime.fromisoformat(seen)).total_seconds() > ACTIVE_USER_WINDOW:
+                continue
+            quiet *= 1 - self.hour_likelihood(now.hour, user_id)
+        return 1 - quiet
+
+    def next_interval(self, now=None, last_seen=None):
+        """Через сколько секунд проверять сообщения"""
+        now = now or datetime.now()
+        quiet = max(0.0, (now - self.last_activity).total_seconds())
+
+        # Экспоненциальный отступ в тишине (степень ограничена: неделя тишины
+        # иначе переполняет float)
+        doublings = min(quiet / BACKOFF_STEP, math.log2(MAX_INTERVAL / FAST_INTERVAL))
+        backoff = FAST_INTERVAL * 2 ** doublings
+
+        # В часы, когда кто-то обычно пишет, не уходим в долгий сон
+        likelihood = self.expected_activity(now, last_seen)
+        ceiling = ACTIVE_HOUR_INTERVAL + (MAX_INTERVAL - ACTIVE_HOUR_INTERVAL) * (1 - likelihood)
+
+        return int(max(FAST_INTERVAL, min(backoff, ceiling, MAX_INTERVAL)))
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+⏳ Adaptive Timeout - таймауты Claude по истории длительностей действий
+"""
+
+import threading
+
+# Пока истории мало - старый фиксированный таймаут
+DEFAULT_TIMEOUT = 120
+MIN_SAMPLES = 5
+HISTORY_SIZE = 50
+# Запас над p95 наблюдаемых длительностей
+HEADROOM = 1.5
+MIN_TIMEOUT = 30
+# Нижние границы по действиям: ответ на сообщения с вызовами Telegram не режем
+# по быстрой истории пустых проверок
+MIN_TIMEOUTS = {
+    'check_messages': 90,
+}
+# Потолки по действиям: долгим размышлениям разрешено больше
+MAX_TIMEOUTS = {
+    'deep_thinking': 900,
+    'research_interests': 600,
+}
+DEFAULT_MAX_TIMEOUT = 300
+
+
+class AdaptiveTimeouts:
+    """История длительностей хранится в StateStore: map 'timeout_history'"""
+
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+        self.history = store.get_map('timeout_history')
+
+    def timeout_for(self, action):
+        """Таймаут для действия: p95 истории с запасом, в пределах границ"""
+        samples = self.history.get(action, [])
+        if len(samples) < MIN_SAMPLES:
+            return DEFAULT_TIMEOUT
+
+        ordered = sorted(samples)
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        ceiling = MAX_TIMEOUTS.get(action, DEFAULT_MAX_TIMEOUT)
+        floor = MIN_TIMEOUTS.get(action, MIN_TIMEOUT)
+        return int(max(floor, min(ceiling, p95 * HEADROOM)))
+
+    def record(self, action, seconds, timed_out=False):
+        """Запоминает длительность; таймаут считается как «нужно было больше»"""
+        if timed_out:
+            seconds = seconds * HEADROOM
+        with self.lock:
+            samples = self.history.setdefault(action, [])
+            samples.append(round(seconds, 2))
+            del samples[:-HISTORY_SIZE]
+            self.store.set_map_item('timeout_history', action, samples)
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark - нагрузочный прогон оркестратора с фальшивым claude
+
+Копирует autonomy/ во временную папку, кладёт в PATH заглушку `claude`
+с настраиваемой задержкой, долей ошибок и ответом и гоняет через неё
+execute_action, run_claude_command, путь перезапуска и Watchdog.monitor.
+
+    python3 autonomy/benchmark.py --actions 50 --delay 0.2
+    python3 autonomy/benchmark.py --scenarios restart --fail-rate 1 --actions 3
+"""
+
+import argparse
+import importlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+AUTONOMY_DIR = Path(__file__).resolve().parent
+SCENARIOS = ['overhead', 'execute_action', 'daemon_queue', 'restart', 'watchdog']
+
+STUB_CLAUDE = '''#!/usr/bin/env python3
+import os, random, re, sys, time
+prompt = sys.stdin.read() if not sys.stdin.isatty() else ' '.join(sys.argv[1:])
+time.sleep(float(os.environ.get('CLAUDE_STUB_DELAY', '0')))
+if random.random() < float(os.environ.get('CLAUDE_STUB_FAIL_RATE', '0')):
+    sys.stderr.write('stub failure\\n')
+    sys.exit(1)
+output = os.environ.get('CLAUDE_STUB_OUTPUT')
+if output is None:
+    # По умолчанию эхо (для health check) и маркеры для пачек
+    output = prompt[:200]
+    for index in re.findall(r'^=== TASK (\\d+) ===', prompt, re.MULTILINE):
+        output += '\\n=== RESULT %s ===\\nok' % index
+print(output)
+'''
+
+
+def percentile(values, fraction):
+    """Перцентиль без интерполяции (values не пустой)"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(name, latencies, elapsed, extra=None):
+    """Сводка по сценарию: действия в минуту и перцентили задержки"""
+    result = {
+        'scenario': name,
+        'count': len(latencies),
+        'elapsed_s': round(elapsed, 3),
+        'actions_per_min': round(len(latencies) / elapsed * 60, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+    }
+    result.update(extra or {})
+    return result
+
+
+class Benchmark:
+    def __init__(self, args):
+        self.args = args
+        self.workdir = Path(tempfile.mkdtemp(prefix='life_bench_'))
+        self.original_cwd = os.getcwd()
+
+    def setup(self):
+        """Готовит изолированную копию autonomy/ и заглушку claude"""
+        autonomy = self.workdir / 'autonomy'
+        shutil.copytree(AUTONOMY_DIR, autonomy, ignore=shutil.ignore_patterns('state', 'logs', '__pycache__', '*.log'))
+        (autonomy / 'logs').mkdir()
+
+        bin_dir = self.workdir / 'bin'
+        bin_dir.mkdir()
+        stub = bin_dir / 'claude'
+        stub.write_text(STUB_CLAUDE)
+        stub.chmod(0o755)
+
+        os.environ['PATH'] = f"{bin_dir}{os.pathsep}{os.environ['PATH']}"
+        os.environ['CLAUDE_STUB_DELAY'] = str(self.args.delay)
+        os.environ['CLAUDE_STUB_FAIL_RATE'] = str(self.args.fail_rate)
+        if self.args.output is not None:
+            os.environ['CLAUDE_STUB_OUTPUT'] = self.args.output
+        os.environ['CLAUDE_POOL_SIZE'] = str(self.args.workers)
+        os.environ['LIFE_STATE_DIR'] = str(self.workdir / 'state')
+        os.environ['LIFE_STATE_DB'] = str(self.workdir / 'state' / 'state.db')
+        os.environ['LIFE_MEMORY_DIR'] = str(self.workdir / 'Memory')
+
+        # Модули читают пути относительно cwd - работаем внутри копии
+        os.chdir(autonomy)
+        sys.path.insert(0, str(autonomy))
+        self.orchestrator_module = importlib.import_module('life_orchestrator')
+        self.watchdog_module = importlib.import_module('watchdog')
+
+    def make_orchestrator(self):
+        orchestrator = self.orchestrator_module.LifeOrchestrator()
+        # Меряем конвейер, а не бюджеты: лимит без ограничений, но с его накладными расходами
+        limiter_module = importlib.import_module('rate_limiter')
+        unlimited = {klass: dict(budget, per_minute=1e6, burst=1e6, concurrency=1000)
+                     for klass, budget in limiter_module.BUDGETS.items()}
+        orchestrator.limiter = limiter_module.RateLimiter(orchestrator.store, unlimited, max_concurrency=1000)
+        orchestrator.claude_pool.limiter = orchestrator.limiter
+        orchestrator.failover.limiter = orchestrator.limiter
+        # Каждый сбой сценария restart должен доходить до восстановления, без пауз
+        failover_module = importlib.import_module('failover')
+        failover_module.BASE_BACKOFF = 0
+        failover_module.FAILURE_THRESHOLD = float('inf')
+        # Синтетические пользователи, которым пора написать
+        silent_since = datetime.now() - timedelta(minutes=120)
+        for user_id in range(self.args.users):
+            orchestrator.record_user_activity(100000 + user_id, silent_since)
+        return orchestrator
+
+    def synthetic_decisions(self, orchestrator, count):
+        """Смесь действий, похожая на дневную нагрузку"""
+        decisions = []
+        for i in range(count):
+            kind = i % 4
+            if kind == 0:
+                decisions.append({'action': 'check_messages', 'reason': 'bench'})
+            elif kind == 1:
+                user_id = str(100000 + i % max(1, self.args.users))
+                decisions.append({
+                    'action': 'proactive_message', 'reason': 'bench',
+                    'params': {'user_id': user_id, 'style': 'casual_check'}
+                })
+            else:
+                # Мимо мемоизации: в бенчмарке память не меняется
+                background = list(self.orchestrator_module.BACKGROUND_INPUTS)
+                decisions.append({'action': background[i % len(background)], 'reason': 'bench', 'params': {}})
+            # Каждое синтетическое действие уникально для очереди с дедупликацией
+            decisions[-1]['dedupe_key'] = f"bench:{i}"
+        return decisions
+
+    def run_overhead(self):
+        """Чистая стоимость запуска процесса: заглушка без задержки"""
+        os.environ['CLAUDE_STUB_DELAY'] = '0'
+        os.environ['CLAUDE_STUB_FAIL_RATE'] = '0'
+        orchestrator = self.make_orchestrator()
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(self.args.actions):
+            t0 = time.perf_counter()
+            orchestrator.run_claude_command("bench")
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+        os.environ['CLAUDE_STUB_DELAY'] = str(self.args.delay)
+        os.environ['CLAUDE_STUB_FAIL_RATE'] = str(self.args.fail_rate)
+        return summarize('overhead', latencies, elapsed, {
+            'subprocess_overhead_ms': round(statistics.mean(latencies) * 1000, 1)
+        })
+
+    def run_execute_action(self):
+        """Разовый режим: решение и выполнение по одному"""
+        orchestrator = self.make_orchestrator()
+        latencies = []
+        started = time.perf_counter()
+        for decision in self.synthetic_decisions(orchestrator, self.args.actions):
+            t0 = time.perf_counter()
+            orchestrator.execute_action(decision)
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+        return summarize('execute_action', latencies, elapsed, {
+            'subprocess_overhead_ms': round((statistics.mean(latencies) - self.args.delay) * 1000, 1)
+        })
+
+    def run_daemon_queue(self):
+        """Резидентный режим: прогретый пул, пачки и параллельность"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        orchestrator = self.make_orchestrator()
+        orchestrator.claude_pool.start()
+        orchestrator.action_executor = ThreadPoolExecutor(max_workers=orchestrator.claude_pool.size * 2)
+        orchestrator.running = True
+        time.sleep(0.5)  # даём пулу прогреться
+
+        enqueued = {}
+        completed = []
+        done_keys = set()
+        rechecks = []
+        started = time.perf_counter()
+        original_update = orchestrator.update_state_after_action
+
+        def timed_update(action, decision):
+            original_update(action, decision)
+            # Повторная проверка за слитые сообщения - не синтетическое действие
+            if not decision.get('dedupe_key', '').startswith('bench:'):
+                rechecks.append(decision['dedupe_key'])
+                return
+            done_keys.add(decision['dedupe_key'])
+            # Повторы без пачки - копии решения, считаем от старта
+            completed.append(time.perf_counter() - enqueued.get(id(decision), started))
+
+        orchestrator.update_state_after_action = timed_update
+
+        decisions = self.synthetic_decisions(orchestrator, self.args.actions)
+        calls = []
+        original_run = orchestrator.claude_pool.run
+        orchestrator.claude_pool.run = lambda *a, **kw: calls.append(1) or original_run(*a, **kw)
+
+        started = time.perf_counter()
+        for decision in decisions:
+            enqueued[id(decision)] = time.perf_counter()
+            orchestrator.action_queue.append(decision)
+        # Отправка не блокирует: ждём, пока очередь и выполняемое опустеют
+        while orchestrator.action_queue or orchestrator.in_flight:
+            orchestrator.drain_action_queue()
+            orchestrator.wakeup.wait(0.05)
+            orchestrator.wakeup.clear()
+        elapsed = time.perf_counter() - started
+
+        orchestrator.action_executor.shutdown(wait=True)
+        orchestrator.claude_pool.shutdown()
+
+        # Проверки сообщений, пришедшие во время другой проверки, сливаются в одну
+        # повторную (recheck) - это не потеря, ожидаемый итог меньше на них
+        missing = [d for d in decisions if d['dedupe_key'] not in done_keys]
+        merged = sum(1 for d in missing if d['action'] == 'check_messages')
+        lost = len(missing) - merged
+        if lost or (merged and not rechecks):
+            print(f"daemon_queue: не выполнено {lost} действий, слито проверок {merged}, "
+                  f"повторных {len(rechecks)}", file=sys.stderr)
+        return summarize('daemon_queue', completed, elapsed, {
+            'cli_invocations': len(calls),
+            'expected': len(decisions) - merged,
+            'merged_checks': merged,
+            'rechecks': len(rechecks),
+            'lost': lost,
+        })
+
+    def run_restart(self):
+        """Путь сбоя: ошибка CLI → перезапуск через ./start → повтор/fallback"""
+        os.environ['CLAUDE_STUB_FAIL_RATE'] = str(max(self.args.fail_rate, 1.0))
+        orchestrator = self.make_orchestrator()
+        restarts = []
+        original_restart = orchestrator.restart_claude_session
+
+        def timed_restart():
+            t0 = time.perf_counter()
+            result = original_restart()
+            restarts.append(time.perf_counter() - t0)
+            return result
+
+        orchestrator.restart_claude_session = timed_restart
+        latencies = []
+        started = time.perf_counter()
+        for decision in self.synthetic_decisions(orchestrator, self.args.actions):
+            t0 = time.perf_counter()
+            orchestrator.execute_action(decision)
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+        os.environ['CLAUDE_STUB_FAIL_RATE'] = str(self.args.fail_rate)
+        return summarize('restart', latencies, elapsed, {
+            'restarts': len(restarts),
+            'restart_mean_ms': round(statistics.mean(restarts) * 1000, 1) if restarts else None
+        })
+
+    def run_watchdog(self):
+        """Watchdog.monitor при давней последней активности (без жёсткого восстановления)"""
+        watchdog = self.watchdog_module.Watchdog()
+        # Восстановление перезапускает настоящую сессию - в бенчмарке его не трогаем
+        watchdog.perform_recovery = lambda: False
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(self.args.actions):
+            watchdog.store.set('watchdog.last_success', (datetime.now() - timedelta(hours=1)).isoformat())
+            t0 = time.perf_counter()
+            watchdog.monitor()
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+        return summarize('watchdog', latencies, elapsed)
+
+    def run(self):
+        self.setup()
+        try:
+            return [getattr(self, f"run_{name}")() for name in self.args.scenarios]
+        finally:
+            os.chdir(self.original_cwd)
+            if not self.args.keep:
+                shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def print_report(results):
+    print(f"{'scenario':16} {'count':>6} {'act/min':>9} {'p50 ms':>9} {'p99 ms':>9}  extra")
+    for r in results:
+        extra = {k: v for k, v in r.items()
+                 if k not in ('scenario', 'count', 'elapsed_s', 'actions_per_min', 'p50_ms', 'p99_ms')}
+        print(f"{r['scenario']:16} {r['count']:>6} {r['actions_per_min']:>9} "
+              f"{str(r['p50_ms']):>9} {str(r['p99_ms']):>9}  {extra}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк оркестратора с заглушкой claude")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS,
+                        default=['overhead', 'execute_action', 'daemon_queue', 'watchdog'])
+    parser.add_argument('--actions', type=int, default=20, help="действий на сценарий")
+    parser.add_argument('--delay', type=float, default=0.1, help="задержка заглушки, с")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="доля ошибок заглушки")
+    parser.add_argument('--output', help="фиксированный ответ заглушки")
+    parser.add_argument('--users', type=int, default=8, help="синтетических пользователей")
+    parser.add_argument('--workers', type=int, default=2, help="размер пула Claude")
+    parser.add_argument('--json', help="сохранить результаты в JSON")
+    parser.add_argument('--keep', action='store_true', help="не удалять рабочую папку")
+    args = parser.parse_args()
+
+    results = Benchmark(args).run()
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
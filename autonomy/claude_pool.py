@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+🔥 Claude Pool - пул заранее запущенных процессов Claude CLI
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import queue
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limiter import RateLimited
+
+# Сколько процессов держать наготове
+DEFAULT_POOL_SIZE = int(os.environ.get('CLAUDE_POOL_SIZE', 2))
+# Сколько задач может ждать свободного воркера сверх размера пула
+DEFAULT_MAX_PENDING = int(os.environ.get('CLAUDE_POOL_QUEUE', 8))
+# Прогретый процесс старше этого считается несвежим (секунды)
+WORKER_MAX_IDLE = 600
+
+# Классы приоритета: меньше - важнее
+PRIORITY_USER = 0         # ответ человеку
+PRIORITY_CARE = 1         # проактивная забота
+PRIORITY_BACKGROUND = 2   # фоновые задачи
+PRIORITY_MAINTENANCE = 3  # обслуживание, долгие размышления
+# Прерывать можно только фон: проактивное сообщение могло уже уйти человеку
+PREEMPTIBLE = PRIORITY_BACKGROUND
+# Класс общего лимита вызовов (rate_limiter.py) по приоритету
+LIMITER_CLASSES = {
+    PRIORITY_USER: 'user',
+    PRIORITY_CARE: 'care',
+    PRIORITY_BACKGROUND: 'background',
+    PRIORITY_MAINTENANCE: 'maintenance',
+}
+
+
+class PoolBusy(Exception):
+    """Очередь пула переполнена - вызывающему стоит подождать"""
+
+
+class Preempted(Exception):
+    """Задачу прервали ради более важной - её стоит поставить в очередь заново"""
+
+    def __init__(self, message, output=''):
+        super().__init__(message)
+        self.output = output
+
+
+class ClaudeWorkerPool:
+    """Пул прогретых процессов `claude --no-markdown`
+
+    Процесс стартует заранее и ждёт команду на stdin, поэтому время запуска
+    CLI не попадает на путь ответа. После использования воркер заменяется
+    новым в фоне.
+
+    Свободный воркер достаётся самой важной из ждущих задач. Если все заняты,
+    а пришла задача важнее фоновой, процесс фоновой задачи гасится и она
+    получает Preempted.
+    """
+
+    def __init__(self, size=None, max_pending=None, command=None, limiter=None):
+        self.size = size or DEFAULT_POOL_SIZE
+        self.max_pending = DEFAULT_MAX_PENDING if max_pending is None else max_pending
+        self.command = command or ['claude', '--no-markdown']
+        # Общий на все процессы лимит вызовов (None - без лимита)
+        self.limiter = limiter
+
+        self.idle = queue.Queue()  # (started_at, Popen)
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.slots = threading.Condition(self.lock)
+        self.free_slots = self.size
+        self.waiting = []   # куча (priority, seq)
+        self.running = {}   # seq -> {'priority', 'proc', 'preempted'}
+        self.seq = itertools.count()
+        # Поток на каждую допущенную задачу: ждущие воркера не должны
+        # задерживать важную на пути к очереди приоритетов
+        self.executor = ThreadPoolExecutor(max_workers=self.size + self.max_pending)
+        self.started = False
+
+    def start(self):
+        """Прогревает пул"""
+        self.started = True
+        for _ in range(self.size):
+            self._replenish()
+        logging.info(f"Пул Claude запущен: {self.size} воркеров")
+
+    def shutdown(self):
+        """Останавливает пул и гасит прогретые процессы"""
+        self.started = False
+        self.executor.shutdown(wait=False)
+        while True:
+            try:
+                _, proc = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            proc.kill()
+            proc.wait()
+
+    def _spawn(self):
+        """Запускает процесс, который ждёт команду на stdin"""
+        return subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            # Своя группа процессов: при вытеснении гасим и дочерние
+            start_new_session=True
+        )
+
+    def _kill_group(self, proc):
+        """Гасит воркер вместе с дочерними процессами (они держат stdout открытым)"""
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            proc.kill()
+
+    def _replenish(self):
+        """Добавляет свежий воркер в пул (в фоне)"""
+        def warm():
+            if self.idle.qsize() >= self.size:
+                return
+            try:
+                self.idle.put((time.monotonic(), self._spawn()))
+            except Exception as e:
+                logging.error(f"Не удалось прогреть воркер: {str(e)}")
+
+        threading.Thread(target=warm, daemon=True).start()
+
+    def _take_worker(self):
+        """Берёт живой прогретый воркер или запускает новый"""
+        while True:
+            try:
+                started_at, proc = self.idle.get_nowait()
+            except queue.Empty:
+                return self._spawn()
+
+            fresh = time.monotonic() - started_at < WORKER_MAX_IDLE
+            if proc.poll() is None and fresh:
+                return proc
+
+            # Воркер умер или залежался - выбрасываем и заменяем
+            proc.kill()
+            proc.wait()
+            if self.started:
+                self._replenish()
+
+    def _reserve(self):
+        """Занимает место в очереди пула или сообщает о перегрузке"""
+        with self.lock:
+            if self.pending >= self.size + self.max_pending:
+                raise PoolBusy(f"В очереди пула уже {self.pending} задач")
+            self.pending += 1
+
+    def _acquire(self, priority):
+        """Ждёт свободный воркер в порядке приоритета; возвращает запись о задаче"""
+        with self.slots:
+            ticket = (priority, next(self.seq))
+            heapq.heappush(self.waiting, ticket)
+            while not (self.free_slots > 0 and self.waiting[0] == ticket):
+                self._preempt_for(priority)
+                self.slots.wait()
+            heapq.heappop(self.waiting)
+            self.free_slots -= 1
+            entry = {'priority': priority, 'proc': None, 'preempted': False}
+            self.running[ticket[1]] = entry
+            # Следующий в очереди мог дождаться второго свободного воркера
+            self.slots.notify_all()
+            return ticket[1], entry
+
+    def _release(self, seq):
+        with self.slots:
+            self.running.pop(seq, None)
+            self.free_slots += 1
+            self.slots.notify_all()
+
+    def _preempt_for(self, priority):
+        """Все воркеры заняты - гасим наименее важную фоновую задачу (под self.lock)"""
+        if self.free_slots > 0 or any(entry['preempted'] for entry in self.running.values()):
+            return
+        victims = [
+            (entry['priority'], seq) for seq, entry in self.running.items()
+            if entry['priority'] >= PREEMPTIBLE and entry['priority'] > priority
+        ]
+        if not victims:
+            return
+        _, seq = max(victims)
+        entry = self.running[seq]
+        entry['preempted'] = True
+        if entry['proc'] is not None and entry['proc'].poll() is None:
+            self._kill_group(entry['proc'])
+        logging.info(f"Прерываю задачу приоритета {entry['priority']} ради приоритета {priority}")
+
+    def _execute(self, command, timeout, on_chunk=None, priority=PRIORITY_USER):
+        """Выполняет команду, освобождая место в очереди по завершении"""
+        try:
+            seq, entry = self._acquire(priority)
+            slot_id = None
+            try:
+                if self.limiter is not None:
+                    try:
+                        slot_id = self.limiter.acquire(LIMITER_CLASSES.get(priority, 'background'), hold=timeout + 30)
+                    except RateLimited as e:
+                        raise PoolBusy(str(e)) from e
+                with self.lock:
+                    if entry['preempted']:
+                        raise Preempted("Прервана до запуска")
+                proc = self._take_worker()
+                with self.lock:
+                    entry['proc'] = proc
+                    if entry['preempted']:
+                        self._kill_group(proc)
+                if self.started:
+                    self._replenish()
+
+                try:
+                    result = self._communicate(proc, command, timeout, on_chunk)
+                except subprocess.TimeoutExpired as e:
+                    if entry['preempted']:
+                        raise Preempted("Прервана ради более важной задачи", e.output or '')
+                    raise
+                if entry['preempted']:
+                    raise Preempted("Прервана ради более важной задачи", result.stdout or '')
+                return result
+            finally:
+                if slot_id is not None:
+                    self.limiter.release(slot_id)
+                self._release(seq)
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def _communicate(self, proc, command, timeout, on_chunk):
+        """Отдаёт команду воркеру и собирает ответ"""
+        if on_chunk is None:
+            try:
+                stdout, stderr = proc.communicate(input=command, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self._kill_group(proc)
+                stdout, stderr = proc.communicate()
+                # Частичный вывод не выбрасываем - отдаём в исключении
+                raise subprocess.TimeoutExpired(proc.args, timeout, output=stdout, stderr=stderr)
+        else:
+            stdout, stderr = self._stream(proc, command, timeout, on_chunk)
+
+        return subprocess.CompletedProcess(proc.args, proc.returncode, stdout, stderr)
+
+    def _stream(self, proc, command, timeout, on_chunk):
+        """Читает stdout по строкам и отдаёт законченные абзацы сразу"""
+        stdout_lines = []
+        stderr_lines = []
+
+        def emit(paragraph):
+            try:
+                on_chunk(''.join(paragraph))
+            except Exception as e:
+                logging.error(f"Ошибка обработки фрагмента ответа: {str(e)}")
+
+        def read_stdout():
+            paragraph = []
+            for line in proc.stdout:
+                stdout_lines.append(line)
+                if line.strip():
+                    paragraph.append(line)
+                elif paragraph:
+                    emit(paragraph)
+                    paragraph = []
+            if paragraph:
+                emit(paragraph)
+
+        def read_stderr():
+            stderr_lines.extend(proc.stderr)
+
+        readers = [
+            threading.Thread(target=read_stdout, daemon=True),
+            threading.Thread(target=read_stderr, daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+
+        try:
+            proc.stdin.write(command)
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            # Дочерние процессы держат stdout - без них читатели не дождутся конца
+            self._kill_group(proc)
+            proc.wait()
+            for reader in readers:
+                reader.join(timeout=5)
+            raise subprocess.TimeoutExpired(
+                proc.args, timeout, output=''.join(stdout_lines), stderr=''.join(stderr_lines)
+            )
+
+        for reader in readers:
+            reader.join()
+        return ''.join(stdout_lines), ''.join(stderr_lines)
+
+    def run(self, command, timeout=120, on_chunk=None, priority=PRIORITY_USER):
+        """Выполняет команду на свободном воркере (блокирующе)
+
+        Возвращает subprocess.CompletedProcess, при таймауте бросает
+        subprocess.TimeoutExpired (с частичным выводом) - как subprocess.run.
+        Если передан on_chunk, законченные абзацы ответа отдаются ему по мере
+        появления, не дожидаясь завершения процесса. Фоновые задачи
+        (priority >= PRIORITY_BACKGROUND) могут быть прерваны - Preempted.
+        """
+        self._reserve()
+        return self._execute(command, timeout, on_chunk, priority)
+
+    def submit(self, command, timeout=120, on_chunk=None, priority=PRIORITY_USER):
+        """Ставит команду в пул, возвращает Future"""
+        self._reserve()
+        try:
+            return self.executor.submit(self._execute, command, timeout, on_chunk, priority)
+        except RuntimeError:
+            with self.lock:
+                self.pending -= 1
+            raise
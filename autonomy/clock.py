@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+🕰️ Clock - источник времени для решений оркестратора
+
+Оркестратор и задачи берут «сейчас» у часов, а не у datetime.now(), поэтому
+симулятор (simulator.py) может прогнать сутки расписания за секунды на
+виртуальных часах. Длительности реальных вызовов (time.monotonic) часы не
+заменяют - они меряют настоящие процессы.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+
+class SystemClock:
+    """Настоящее время"""
+
+    def now(self):
+        return datetime.now()
+
+    def time(self):
+        return time.time()
+
+
+class VirtualClock:
+    """Время, которое идёт только когда его двигают"""
+
+    def __init__(self, start=None):
+        self.current = start or datetime.now()
+
+    def now(self):
+        return self.current
+
+    def time(self):
+        return self.current.timestamp()
+
+    def advance(self, seconds):
+        self.current += timedelta(seconds=seconds)
+
+    def advance_to(self, when):
+        """Перевести часы вперёд (назад время не идёт)"""
+        if when > self.current:
+            self.current = when
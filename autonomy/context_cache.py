@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+🧩 Context Cache - компактный контекст пользователя с LRU-кэшем
+
+Собирает profile/essence/patterns/predictions/care в один короткий блок для
+промптов и пересобирает его только когда меняются сами файлы.
+"""
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from state_store import MEMORY_DIR
+
+# Файлы контекста в порядке важности
+CONTEXT_FILES = ['essence.md', 'profile.md', 'care.md', 'predictions.md', 'patterns.md']
+# Сколько символов брать из одного файла
+MAX_FILE_CHARS = 1500
+DEFAULT_CACHE_SIZE = 256
+
+
+class UserContextCache:
+    def __init__(self, root=MEMORY_DIR / "people", maxsize=DEFAULT_CACHE_SIZE):
+        self.root = Path(root)
+        self.maxsize = maxsize
+        self.entries = OrderedDict()  # user_id -> (signature, sections)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _signature(self, user_id):
+        """Отпечаток файлов пользователя: mtime и размер (только stat)"""
+        signature = []
+        for name in CONTEXT_FILES:
+            try:
+                st = (self.root / user_id / name).stat()
+                signature.append((name, st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append((name, None, None))
+        return tuple(signature)
+
+    def _build(self, user_id):
+        """Читает файлы: [(имя, текст)] в порядке важности"""
+        sections = []
+        for name in CONTEXT_FILES:
+            path = self.root / user_id / name
+            try:
+                text = path.read_text(encoding='utf-8').strip()
+            except OSError:
+                continue
+            if not text:
+                continue
+            if len(text) > MAX_FILE_CHARS:
+                text = text[:MAX_FILE_CHARS].rstrip() + "\n…"
+            sections.append((Path(name).stem, f"## {Path(name).stem}\n{text}"))
+        return sections
+
+    def get(self, user_id):
+        """Контекст пользователя (пустая строка, если о нём ничего нет)"""
+        return "\n\n".join(text for _, text in self.sections(user_id))
+
+    def sections(self, user_id):
+        """Контекст по файлам - чтобы обрезать по важности"""
+        user_id = str(user_id)
+        signature = self._signature(user_id)
+
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry and entry[0] == signature:
+                self.entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+
+        sections = self._build(user_id)
+
+        with self.lock:
+            self.misses += 1
+            self.entries[user_id] = (signature, sections)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return sections
+
+    def invalidate(self, user_id=None):
+        """Сбрасывает кэш пользователя (или весь)"""
+        with self.lock:
+            if user_id is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(str(user_id), None)
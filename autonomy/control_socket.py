@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+🔌 Control Socket - локальный Unix-сокет резидентного оркестратора
+
+Протокол: одна строка `КОМАНДА [аргументы]` в ответ на одну строку JSON.
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+
+from state_store import STATE_DIR
+
+DEFAULT_SOCKET = STATE_DIR / 'orchestrator.sock'
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline().decode('utf-8', errors='replace').strip()
+        if not line:
+            return
+        command, *args = line.split()
+        handler = self.server.handlers.get(command.upper())
+        if handler is None:
+            reply = {'ok': False, 'error': f"unknown command {command}"}
+        else:
+            try:
+                reply = handler(args)
+            except Exception as e:
+                logging.error(f"Ошибка команды {command}: {str(e)}")
+                reply = {'ok': False, 'error': str(e)}
+        self.wfile.write((json.dumps(reply, default=str) + "\n").encode('utf-8'))
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ControlServer:
+    def __init__(self, path=DEFAULT_SOCKET):
+        self.path = str(path)
+        self.handlers = {}
+        self.server = None
+
+    def register(self, command, handler):
+        """handler(args) -> dict с ответом"""
+        self.handlers[command.upper()] = handler
+
+    def start(self):
+        # Сокет от упавшего процесса мешает bind
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = _Server(self.path, _Handler)
+        self.server.handlers = self.handlers
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logging.info(f"Управляющий сокет: {self.path}")
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def send_command(command, *args, path=DEFAULT_SOCKET, timeout=1.0):
+    """Отправляет команду оркестратору; None, если он не отвечает"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(path))
+            sock.sendall((' '.join([command, *map(str, args)]) + "\n").encode('utf-8'))
+            data = b''
+            while not data.endswith(b"\n"):
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+        return json.loads(data.decode('utf-8')) if data else None
+    except (OSError, ValueError):
+        return None
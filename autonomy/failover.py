@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+🔁 Failover - резервная сессия Claude и перезапуски с backoff
+
+Рядом с основной сессией (state/claude.pid) держится прогретая резервная
+(state/claude.standby.pid). При сбое основная гасится по своему PID, резервная
+сразу становится основной, а новая резервная поднимается в фоне. Холодный
+старт через ./start - только если резерва нет.
+
+Восстановления без подтверждённого здоровья между ними идут с растущей
+паузой; после FAILURE_THRESHOLD подряд цепь размыкается на CIRCUIT_OPEN секунд,
+затем разрешается одна пробная попытка. Состояние - в state/state.db, общее
+для оркестратора, health monitor, watchdog и life_daemon.sh.
+
+    python3 autonomy/failover.py status
+    python3 autonomy/failover.py recover --reason life_daemon
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from metrics import REGISTRY as metrics, export as export_metrics
+from rate_limiter import RateLimited, RateLimiter
+from state_store import StateStore
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+# Те же файлы, что пишет ./start (он работает из autonomy/)
+PRIMARY_PID = SCRIPT_DIR / 'state' / 'claude.pid'
+STANDBY_PID = SCRIPT_DIR / 'state' / 'claude.standby.pid'
+# Пауза после первого неподтверждённого восстановления, дальше - вдвое больше (секунды)
+BASE_BACKOFF = 10
+MAX_BACKOFF = 15 * 60
+# Столько восстановлений подряд без здоровья между ними - цепь размыкается
+FAILURE_THRESHOLD = 5
+CIRCUIT_OPEN = 3600
+# Сколько ждать мягкой остановки старой сессии (секунды)
+STOP_GRACE = 5
+
+
+def read_pid(path):
+    try:
+        return int(path.read_text().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def pid_alive(pid):
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+
+
+class FailoverManager:
+    def __init__(self, store=None, limiter=None):
+        self.store = store or StateStore()
+        self.limiter = limiter or RateLimiter(self.store)
+
+    def begin_attempt(self):
+        """Разрешено ли восстановление сейчас; если да - засчитывает попытку
+
+        Попытка считается неудачной, пока record_success() не подтвердит
+        здоровье, поэтому сразу сдвигаем следующее разрешённое время.
+        Возвращает (True, номер попытки) или (False, причина).
+        """
+        now = time.time()
+        with self.store.transaction():
+            open_until = self.store.get('failover.open_until', 0)
+            if now < open_until:
+                return False, f"цепь разомкнута ещё {int(open_until - now)} с"
+            next_attempt = self.store.get('failover.next_attempt', 0)
+            if now < next_attempt:
+                return False, f"пауза между восстановлениями ещё {int(next_attempt - now)} с"
+
+            failures = self.store.get('failover.failures', 0) + 1
+            delay = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (failures - 1))
+            self.store.set('failover.failures', failures)
+            self.store.set('failover.next_attempt', now + delay)
+            if failures >= FAILURE_THRESHOLD:
+                # Эта попытка - последняя (или пробная после размыкания)
+                self.store.set('failover.open_until', now + CIRCUIT_OPEN)
+        return True, failures
+
+    def record_success(self):
+        """Claude подтверждённо здоров - сбрасываем паузы и замыкаем цепь"""
+        if not self.store.get('failover.failures', 0):
+            return
+        with self.store.transaction():
+            self.store.set('failover.failures', 0)
+            self.store.delete('failover.next_attempt')
+            self.store.delete('failover.open_until')
+        logging.info("Claude здоров, паузы восстановления сброшены")
+
+    def recover(self, reason='unknown'):
+        """Восстанавливает сессию: резерв, а без него - холодный старт"""
+        allowed, info = self.begin_attempt()
+        if not allowed:
+            logging.warning(f"Восстановление ({reason}) пропущено: {info}")
+            metrics.inc('life_failover_total', {'result': 'blocked'}, help="Восстановления сессии Claude")
+            return False
+
+        logging.info(f"Восстановление #{info} ({reason})")
+        if self.promote_standby():
+            result = 'promoted'
+        elif self.cold_start():
+            result = 'cold_start'
+        else:
+            result = 'failed'
+        metrics.inc('life_failover_total', {'result': result}, help="Восстановления сессии Claude")
+
+        self.replenish_standby()
+        return result != 'failed'
+
+    def promote_standby(self):
+        """Резерв жив - он становится основной сессией, старая гасится"""
+        standby = read_pid(STANDBY_PID)
+        if not pid_alive(standby):
+            return False
+        primary = read_pid(PRIMARY_PID)
+        os.replace(STANDBY_PID, PRIMARY_PID)
+        logging.info(f"Резервная сессия {standby} стала основной")
+        if primary and primary != standby:
+            self.stop_session(primary)
+        return True
+
+    def stop_session(self, pid):
+        """Останавливает одну сессию по PID (воркеры пула и чужие процессы не трогаем)"""
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            return
+        deadline = time.monotonic() + STOP_GRACE
+        while time.monotonic() < deadline:
+            if not pid_alive(pid):
+                return
+            time.sleep(0.2)
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    def cold_start(self):
+        """Резерва нет - обычный перезапуск через ./start"""
+        try:
+            with self.limiter.slot('restart', hold=90):
+                # Вывод не перехватываем: сессия остаётся в фоне с унаследованными
+                # дескрипторами, и чтение до EOF ждало бы её завершения.
+                # Свой журнал start пишет в logs/session_starts.log
+                result = subprocess.run(
+                    [str(SCRIPT_DIR / 'start'), '--force', '--quiet'],
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    timeout=60,
+                    cwd=SCRIPT_DIR
+                )
+        except RateLimited as e:
+            logging.warning(f"Холодный старт пропущен: {str(e)}")
+            return False
+        except Exception as e:
+            logging.error(f"Ошибка холодного старта: {str(e)}")
+            return False
+        if result.returncode != 0:
+            logging.error(f"Не удалось запустить Claude: start вернул {result.returncode}")
+            return False
+        logging.info("Claude запущен через start")
+        return True
+
+    def replenish_standby(self):
+        """Поднимает резерв в фоне; процесс переживёт вызывающего"""
+        if pid_alive(read_pid(STANDBY_PID)):
+            return
+        subprocess.Popen(
+            [sys.executable, str(SCRIPT_DIR / 'rate_limiter.py'), 'run', '--class', 'standby',
+             '--', str(SCRIPT_DIR / 'start'), '--standby'],
+            cwd=SCRIPT_DIR,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+        logging.info("Поднимаю резервную сессию")
+
+    def ensure_standby(self):
+        """Резерв нужен, только пока есть основная сессия"""
+        if pid_alive(read_pid(PRIMARY_PID)):
+            self.replenish_standby()
+
+    def status(self):
+        now = time.time()
+        primary = read_pid(PRIMARY_PID)
+        standby = read_pid(STANDBY_PID)
+        open_until = self.store.get('failover.open_until', 0)
+        next_attempt = self.store.get('failover.next_attempt', 0)
+        return {
+            'primary': {'pid': primary, 'alive': pid_alive(primary)},
+            'standby': {'pid': standby, 'alive': pid_alive(standby)},
+            'failures': self.store.get('failover.failures', 0),
+            'circuit': 'open' if now < open_until else 'closed',
+            'next_attempt_in': max(0, int(max(open_until, next_attempt) - now)),
+        }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    parser = argparse.ArgumentParser(description="Резервная сессия Claude и восстановление")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('status', help="сессии, счётчик неудач, состояние цепи")
+    recover_parser = sub.add_parser('recover', help="восстановить сессию")
+    recover_parser.add_argument('--reason', default='cli')
+    sub.add_parser('standby', help="поднять резерв, если его нет")
+    args = parser.parse_args()
+
+    manager = FailoverManager()
+    if args.command == 'status':
+        print(json.dumps(manager.status(), ensure_ascii=False, indent=2))
+    elif args.command == 'recover':
+        ok = manager.recover(args.reason)
+        export_metrics(manager.store)
+        sys.exit(0 if ok else 1)
+    elif args.command == 'standby':
+        manager.ensure_standby()
@@ -3,34 +3,111 @@
 🏥 Health Monitor - мониторинг здоровья Claude сессии
 """
 
+import os
 import subprocess
+import sys
 import time
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 
-logging.basicConfig(
-    filename='health_monitor.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+from control_socket import send_command
+from failover import FailoverManager
+from metrics import export as export_metrics
+from rate_limiter import RateLimited, RateLimiter
+from state_store import StateStore
+from structured_log import setup_logging
+
+setup_logging('health_monitor')
+
+# Успешное реальное действие свежее этого считается доказательством здоровья (минуты)
+HEARTBEAT_MAX_AGE = 10
+# Столько неудач подряд - нездоров без лишних проверок
+FAILURE_THRESHOLD = 3
+# Статусы, после которых занятый лимит не считается признаком жизни
+BAD_STATUSES = {'UNHEALTHY', 'TIMEOUT', 'ERROR'}
+
 
 class HealthMonitor:
     def __init__(self):
         self.health_file = Path("state/claude_health.txt")
         self.health_file.parent.mkdir(exist_ok=True)
+        self.session_pid_file = Path(__file__).parent / "state" / "claude.pid"
+        self.store = StateStore()
+        self.limiter = RateLimiter(self.store)
+        self.failover = FailoverManager(self.store, self.limiter)
         
     def check_claude_health(self):
-        """Проверяет здоровье Claude сессии"""
+        """Проверяет здоровье Claude: от дешёвых проверок к дорогим"""
+        for tier, probe in (
+            ('heartbeat', self.check_heartbeat),
+            ('socket', self.check_orchestrator_socket),
+        ):
+            verdict = probe()
+            if verdict is not None:
+                logging.info(f"Health decided by {tier} probe")
+                self._update_health_status("HEALTHY" if verdict else "UNHEALTHY")
+                return verdict
+        
+        # Последний рубеж - настоящий вызов CLI
+        logging.info("Health decided by CLI probe")
+        return self.check_claude_cli()
+    
+    def session_is_alive(self):
+        """Жив ли процесс сессии из ./start (None - PID неизвестен)"""
+        try:
+            pid = int(self.session_pid_file.read_text().strip())
+        except (OSError, ValueError):
+            return None
+        try:
+            os.kill(pid, 0)
+            return True
+        except OSError:
+            return False
+    
+    def check_heartbeat(self):
+        """Уровень 1: PID сессии и исходы реальных действий"""
+        if self.session_is_alive() is False:
+            return False
+        
+        failures = self.store.get('health.consecutive_failures', 0)
+        if failures >= FAILURE_THRESHOLD:
+            logging.warning(f"{failures} неудачных действий подряд")
+            return False
+        
+        heartbeat = self.store.get('health.heartbeat')
+        if failures == 0 and heartbeat:
+            age = datetime.now() - datetime.fromisoformat(heartbeat)
+            if age < timedelta(minutes=HEARTBEAT_MAX_AGE):
+                return True
+        return None
+    
+    def check_orchestrator_socket(self):
+        """Уровень 2: спрашиваем резидентный оркестратор через сокет"""
+        reply = send_command('PING')
+        if not reply or not reply.get('ok'):
+            return None
+        return reply.get('claude_healthy')
+    
+    def last_status(self):
+        """Последний записанный статус здоровья"""
         try:
-            # Пробуем простую команду
-            result = subprocess.run(
-                ['claude', '--no-markdown'],
-                input="echo 'health check'",
-                text=True,
-                capture_output=True,
-                timeout=10
-            )
+            return self.health_file.read_text().split('\n', 1)[0]
+        except OSError:
+            return None
+    
+    def check_claude_cli(self):
+        """Уровень 3: полноценный вызов Claude CLI"""
+        try:
+            # Пробуем простую команду (в общем лимите вызовов)
+            with self.limiter.slot('health', hold=40):
+                result = subprocess.run(
+                    ['claude', '--no-markdown'],
+                    input="echo 'health check'",
+                    text=True,
+                    capture_output=True,
+                    timeout=10
+                )
             
             # Проверяем признаки живой сессии
             output = result.stdout.lower()
@@ -61,6 +138,11 @@ class HealthMonitor:
                 self._update_health_status("UNHEALTHY")
                 return False
                 
+        except RateLimited as e:
+            # Claude сейчас и так вызывают - лишняя проверка только добавит нагрузки
+            status = self.last_status()
+            logging.info(f"CLI probe skipped ({str(e)}), last status: {status}")
+            return status not in BAD_STATUSES
         except subprocess.TimeoutExpired:
             logging.error("Claude health check timeout")
             self._update_health_status("TIMEOUT")
@@ -77,41 +159,23 @@ class HealthMonitor:
         logging.info(f"Health status: {status}")
     
     def restart_if_needed(self):
-        """Перезапускает Claude если нужно"""
-        if not self.check_claude_health():
-            logging.warning("Claude unhealthy, attempting restart...")
-            
-            # Используем скрипт start для перезапуска
-            try:
-                # Определяем путь к скрипту
-                script_dir = Path(__file__).parent
-                start_script = script_dir / 'start'
-                
-                result = subprocess.run(
-                    [str(start_script), '--force', '--quiet'],
-                    capture_output=True,
-                    text=True,
-                    timeout=30,
-                    cwd=script_dir
-                )
-                
-                if result.returncode == 0:
-                    logging.info("Claude restarted successfully via start script")
-                    self._update_health_status("RESTARTED")
-                    return True
-                else:
-                    logging.error(f"Failed to restart Claude: {result.stderr}")
-                    return False
-                    
-            except subprocess.TimeoutExpired:
-                logging.error("Restart timeout")
-                return False
-            except Exception as e:
-                logging.error(f"Restart error: {str(e)}")
-                return False
+        """Перезапускает Claude если нужно (через резерв, с паузами между попытками)"""
+        if self.check_claude_health():
+            self.failover.record_success()
+            return True
         
-        return True
+        logging.warning("Claude unhealthy, attempting failover...")
+        if self.failover.recover('health_monitor'):
+            self._update_health_status("RESTARTED")
+            # Новая сессия - старые неудачи больше не показательны
+            self.store.set('health.consecutive_failures', 0)
+            return True
+        return False
 
 if __name__ == "__main__":
     monitor = HealthMonitor()
-    monitor.restart_if_needed()
\ No newline at end of file
+    ok = monitor.restart_if_needed()
+    # Восстановления и отказы лимита из этого процесса - в общие метрики
+    export_metrics(monitor.store)
+    # Код выхода нужен watchdog: 1 - восстановить не удалось
+    sys.exit(0 if ok else 1)
\ No newline at end of file
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+🌙 Job Runner - долгие задачи по частям с контрольными точками
+
+Задача - последовательность сегментов (промптов). После каждого сегмента и
+каждого фрагмента ответа состояние пишется в state/jobs/<id>.json, так что
+таймаут, перезапуск или падение процесса не теряют сделанного: следующая
+попытка продолжает с того же сегмента и получает уже продуманное.
+"""
+
+import json
+import logging
+import os
+import threading
+
+from clock import SystemClock
+from state_store import STATE_DIR
+
+JOBS_DIR = STATE_DIR / 'jobs'
+# Столько неудачных попыток одного сегмента - задача снимается
+MAX_SEGMENT_ATTEMPTS = 3
+# Незаконченная задача старше этого больше не продолжается (секунды)
+JOB_MAX_AGE = 12 * 3600
+# Сколько текста прошлого сегмента и незаконченной попытки передавать дальше
+CARRY_CHARS = 1500
+# Пауза фонового потока, когда задач нет (секунды)
+IDLE_WAIT = 60
+# Пауза после вытеснения более важной работой (секунды)
+PAUSE_WAIT = 10
+
+
+def _tail(text, limit=CARRY_CHARS):
+    text = (text or '').strip()
+    return text if len(text) <= limit else "…" + text[-limit:]
+
+
+class JobRunner:
+    def __init__(self, execute, on_finished=None, jobs_dir=JOBS_DIR, pause_on=(), clock=None):
+        """execute(prompt, on_chunk) -> ответ или None; on_finished(job) - по завершении
+
+        Исключения из pause_on не считаются неудачей сегмента: фоновый поток
+        просто повторит его чуть позже с контрольной точки.
+        """
+        self.execute = execute
+        self.on_finished = on_finished
+        self.pause_on = tuple(pause_on)
+        self.clock = clock or SystemClock()
+        self.jobs_dir = jobs_dir
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        # Паузу после вытеснения прерывает только остановка, не submit()
+        self.stopping = threading.Event()
+        self.running = False
+        self.thread = None
+
+    def path(self, job_id):
+        return self.jobs_dir / f"{job_id}.json"
+
+    def save(self, job):
+        """Атомарная контрольная точка"""
+        job['updated_at'] = self.clock.time()
+        path = self.path(job['id'])
+        tmp_path = path.with_name(path.name + '.tmp')
+        with self.lock:
+            tmp_path.write_text(json.dumps(job, ensure_ascii=False))
+            os.replace(tmp_path, path)
+
+    def load(self, job_id):
+        try:
+            return json.loads(self.path(job_id).read_text())
+        except (OSError, ValueError):
+            return None
+
+    def create(self, job_id, action, segments):
+        """Новая задача; если такая уже есть - возвращает её (повторный запуск из cron)"""
+        job = self.load(job_id)
+        if job:
+            return job
+        job = {
+            'id': job_id,
+            'action': action,
+            'segments': segments,
+            'step': 0,
+            'attempts': 0,
+            'outputs': [],
+            'partial': '',
+            'status': 'active',
+            'created_at': self.clock.time(),
+        }
+        self.save(job)
+        logging.info(f"Создана задача {job_id}: {len(segments)} сегментов")
+        return job
+
+    def active_job(self, action=None):
+        """Самая старая незаконченная задача (просроченные снимаются)"""
+        jobs = []
+        for path in self.jobs_dir.glob('*.json'):
+            job = self.load(path.stem)
+            if not job or job['status'] != 'active':
+                continue
+            if action and job['action'] != action:
+                continue
+            if self.clock.time() - job['created_at'] > JOB_MAX_AGE:
+                job['status'] = 'expired'
+                self.save(job)
+                logging.warning(f"Задача {job['id']} не закончена вовремя, снята на шаге {job['step']}")
+                continue
+            jobs.append(job)
+        return min(jobs, key=lambda job: job['created_at']) if jobs else None
+
+    def segment_prompt(self, job):
+        """Промпт текущего сегмента с тем, к чему пришли раньше"""
+        prompt = job['segments'][job['step']]
+        if job['outputs']:
+            prompt += f"\nК чему ты пришла в прошлой части:\n{_tail(job['outputs'][-1])}\n"
+        if job['partial']:
+            prompt += f"\nПрошлая попытка этой части прервалась, вот что уже продумано - продолжи отсюда:\n{_tail(job['partial'])}\n"
+        return prompt
+
+    def run_segment(self, job):
+        """Выполняет один сегмент; возвращает ответ или None"""
+        step = job['step']
+
+        def checkpoint_chunk(chunk):
+            job['partial'] += chunk + "\n"
+            self.save(job)
+
+        output = self.execute(self.segment_prompt(job), checkpoint_chunk)
+
+        if output is None:
+            job['attempts'] += 1
+            if job['attempts'] >= MAX_SEGMENT_ATTEMPTS:
+                job['status'] = 'failed'
+                logging.error(f"Задача {job['id']}: сегмент {step + 1} не удался {job['attempts']} раза, снята")
+            self.save(job)
+            return None
+
+        job['outputs'].append(_tail(output))
+        job['step'] += 1
+        job['attempts'] = 0
+        job['partial'] = ''
+        if job['step'] >= len(job['segments']):
+            job['status'] = 'done'
+        self.save(job)
+        logging.info(f"Задача {job['id']}: сегмент {step + 1}/{len(job['segments'])} готов")
+
+        if job['status'] == 'done' and self.on_finished:
+            self.on_finished(job)
+        return output
+
+    def start(self):
+        """Фоновый поток для резидентного режима"""
+        self.running = True
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._loop, name='job-runner', daemon=True)
+        self.thread.start()
+
+    def submit(self):
+        """Разбудить фоновый поток: появилась или продолжается задача"""
+        self.wakeup.set()
+
+    def stop(self):
+        """Остановка после текущего сегмента (контрольная точка уже записана)"""
+        self.running = False
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join()
+
+    def _loop(self):
+        while self.running:
+            job = self.active_job()
+            if job is None:
+                self.wakeup.wait(IDLE_WAIT)
+                self.wakeup.clear()
+                continue
+            try:
+                if self.run_segment(job) is None:
+                    # Не вышло - не долбим Claude подряд
+                    self.wakeup.wait(IDLE_WAIT)
+                    self.wakeup.clear()
+            except self.pause_on as e:
+                logging.info(f"Задача {job['id']} на паузе: {str(e)}")
+                self.stopping.wait(PAUSE_WAIT)
+            except Exception as e:
+                logging.error(f"Ошибка задачи {job['id']}: {str(e)}")
+                self.wakeup.wait(IDLE_WAIT)
+                self.wakeup.clear()
@@ -6,8 +6,22 @@ SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
 cd "$SCRIPT_DIR/.."
 
 LOG_FILE="logs/life_daemon.log"
+# Все вызовы claude - через общий лимит (код 75 - место не досталось)
+LIMIT="python3 autonomy/rate_limiter.py run"
+LIMITED=75
 mkdir -p logs state
 
+# Вывод CLI пишется сюда целиком - держим не больше двух файлов по 5 МБ
+if [ -f "$LOG_FILE" ] && [ "$(wc -c < "$LOG_FILE")" -gt 5242880 ]; then
+    mv -f "$LOG_FILE" "$LOG_FILE.1"
+fi
+
+# Если работает резидентный оркестратор - он сам всё делает
+if [ -f state/orchestrator.pid ] && kill -0 "$(cat state/orchestrator.pid)" 2>/dev/null; then
+    python3 autonomy/state_store.py set-now watchdog.last_success
+    exit 0
+fi
+
 echo "=== Life Daemon запущен: $(date) ===" >> "$LOG_FILE"
 
 # Сначала проверяем здоровье
@@ -19,11 +33,25 @@ HEALTH_STATUS=$(head -n1 state/claude_health.txt 2>/dev/null || echo "UNKNOWN")
 if [ "$HEALTH_STATUS" = "HEALTHY" ] || [ "$HEALTH_STATUS" = "RESTARTED" ]; then
     echo "Claude здоров, выполняем .life" >> "$LOG_FILE"
     # Пытаемся выполнить .life
-    if ! timeout 60 claude --no-markdown ".life" 2>&1 | tee -a "$LOG_FILE"; then
+    $LIMIT --class background --timeout 60 -- claude --no-markdown ".life" 2>&1 | tee -a "$LOG_FILE"
+    STATUS=${PIPESTATUS[0]}
+    if [ "$STATUS" -ne "$LIMITED" ]; then
+        # Исход .life - пульс для health monitor: следующий тик обойдётся без пробы CLI
+        python3 autonomy/state_store.py record-outcome "$STATUS"
+    fi
+    if [ "$STATUS" -eq "$LIMITED" ]; then
+        # Claude и так занят - это не сбой, перезапуск только добавил бы нагрузки
+        echo "Лимит вызовов Claude исчерпан, .life пропущен" >> "$LOG_FILE"
+    elif [ "$STATUS" -ne 0 ]; then
         echo "Команда .life завершилась с ошибкой, перезапускаем" >> "$LOG_FILE"
-        ./autonomy/start --force --quiet
-        # Повторная попытка после перезапуска
-        timeout 60 claude --no-markdown ".life" 2>&1 | tee -a "$LOG_FILE" || true
+        if python3 autonomy/failover.py recover --reason life_daemon; then
+            # Повторная попытка после перезапуска
+            $LIMIT --class background --timeout 60 -- claude --no-markdown ".life" 2>&1 | tee -a "$LOG_FILE"
+            STATUS=${PIPESTATUS[0]}
+            if [ "$STATUS" -ne "$LIMITED" ]; then
+                python3 autonomy/state_store.py record-outcome "$STATUS"
+            fi
+        fi
     fi
 else
     echo "Claude нездоров ($HEALTH_STATUS), используем orchestrator" >> "$LOG_FILE"
@@ -33,6 +61,6 @@ fi
 echo "=== Life Daemon завершен: $(date) ===" >> "$LOG_FILE"
 
 # Обновляем время последней успешной операции
-date -Iseconds > state/last_success.txt
+python3 autonomy/state_store.py set-now watchdog.last_success
 
 echo "" >> "$LOG_FILE"
\ No newline at end of file
@@ -3,68 +3,299 @@
 🧠 Life Orchestrator - интеллектуальный координатор жизни Клэр
 """
 
+import argparse
+import hashlib
+import heapq
+import itertools
 import json
+import os
+import random
+import signal
 import subprocess
-from datetime import datetime, time
+import sys
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
 from pathlib import Path
 import logging
 import time as time_module
 
-# Настройка логирования
-logging.basicConfig(
-    filename='life_orchestrator.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+from action_batcher import ActionBatcher
+from action_queue import ActionQueue
+from adaptive_polling import ActivityModel
+from adaptive_timeout import AdaptiveTimeouts
+from clock import SystemClock
+from claude_pool import (
+    ClaudeWorkerPool, PoolBusy, Preempted,
+    PRIORITY_USER, PRIORITY_CARE, PRIORITY_BACKGROUND, PRIORITY_MAINTENANCE
 )
+from context_cache import UserContextCache
+from job_runner import JobRunner
+from control_socket import ControlServer, send_command
+from failover import FailoverManager
+from memory_compactor import MemoryCompactor
+from memory_index import MemoryIndex
+from metrics import REGISTRY as metrics, MetricsRegistry, export as export_metrics, serve as serve_metrics
+from rate_limiter import RateLimiter
+from state_store import STATE_DIR, StateStore
+from structured_log import log_context, rotate_logs, setup_logging
+from telegram_client import get_client as get_telegram_client
+from token_budget import PromptBudget, record_usage, estimate_tokens
+from proactive_scheduler import ProactiveScheduler
+
+# Настройка логирования
+setup_logging('orchestrator')
+
+# Резидентный режим: границы сна между решениями (секунды)
+DAEMON_MIN_SLEEP = 5
+DAEMON_MAX_SLEEP = 300
+# Пауза после фоновой задачи, чтобы не гонять их подряд
+BACKGROUND_PACE = 600
+
+# Индекс памяти обновляем не чаще (секунды)
+MEMORY_INDEX_REFRESH = 60
+# Как часто проверять размер логов для ротации (секунды)
+LOG_ROTATE_INTERVAL = 300
+
+# Для проверки сообщений подгружаем контекст недавних собеседников
+RECENT_USERS_LIMIT = 3
+RECENT_USERS_HOURS = 24
+
+# Пока push-канал жив, опрос - только редкая подстраховка (секунды)
+PUSH_FALLBACK_INTERVAL = 1800
+# Push-канал считается живым, если сигнал был не раньше (секунды)
+PUSH_ACTIVE_WINDOW = 6 * 3600
+
+# Словари состояния, которые хранятся построчно
+STATE_MAPS = ('users_silence_time', 'users_last_proactive', 'users_unanswered_proactive')
+
+# Пороги проактивности (минуты молчания)
+PROACTIVE_CARE_SILENCE = 60
+PROACTIVE_MESSAGE_SILENCE = 90
+# Не пишем одному человеку чаще, чем раз в это время (минуты); каждое
+# оставшееся без ответа сообщение удваивает паузу
+PROACTIVE_COOLDOWN = 90
+# После стольких проактивных сообщений без ответа ждём, пока человек напишет сам
+PROACTIVE_MAX_UNANSWERED = 3
+# Если действие не дошло до выполнения - повторим через (минуты)
+PROACTIVE_RETRY = 10
+
+# Сколько действие живёт в персистентной очереди, если его никто не взял (секунды)
+ACTION_TTL = {
+    'check_messages': 600,
+    'proactive_message': 1800,
+    'proactive_care': 1800,
+}
+DEFAULT_ACTION_TTL = 3600
+
+# Классы приоритета действий: ответ > забота > фон > обслуживание
+ACTION_PRIORITY = {
+    'check_messages': PRIORITY_USER,
+    'proactive_message': PRIORITY_CARE,
+    'proactive_care': PRIORITY_CARE,
+    'memory_cleanup': PRIORITY_MAINTENANCE,
+    'deep_thinking': PRIORITY_MAINTENANCE,
+}
+
+# Ночное размышление идёт сегментами по столько шагов
+DEEP_THINKING_STEPS = 50
+DEEP_THINKING_SEGMENT = 10
+
+# Фоновые задачи в порядке ротации и виды файлов памяти, от которых они зависят
+# (None - вся память о людях)
+BACKGROUND_INPUTS = {
+    'analyze_patterns': ('conversation',),
+    'research_interests': ('profile', 'conversation'),
+    'update_portrait': None,
+    'prepare_content': ('profile', 'care', 'predictions', 'patterns'),
+}
+# Даже без изменений в памяти задача повторяется через (секунды)
+BACKGROUND_TTL = {
+    'research_interests': 24 * 3600,  # новости по интересам устаревают быстрее
+}
+DEFAULT_BACKGROUND_TTL = 3 * 24 * 3600
+
+# Задачи, которые получают только новый текст разговоров (по смещениям), и
+# файлы контекста с их прошлыми выводами
+INCREMENTAL_TASKS = {
+    'analyze_patterns': ('patterns',),
+    'update_portrait': ('essence', 'profile'),
+}
+# Сколько новых разговоров отдаём за один запуск (символы) - остальное в следующий
+DELTA_MAX_CHARS = 8000
+DELTA_FILE_CHARS = 2000
+
+# Приоритеты частей промпта: меньше - важнее (0 - сама задача, не режется)
+CONTEXT_PRIORITY = 10      # + 10 * номер файла контекста + номер пользователя
+MEMORY_MAP_PRIORITY = 100
+
+# Без Claude отвечаем на входящие коротко и не чаще раза в это время (минуты)
+DIRECT_ACK_COOLDOWN = 30
+DIRECT_ACK_TEXT = "Я на минутку отвлеклась, скоро отвечу нормально 🙏"
+# Из накопленных входящих в промпт идёт не больше стольких последних, текст обрезаем
+INBOX_PROMPT_LIMIT = 15
+INBOX_TEXT_CHARS = 300
+DIRECT_PROACTIVE_MESSAGES = [
+    "Привет! Как дела? Что-то давно не общались",
+    "Эй, всё в порядке? Думала о тебе",
+    "Как ты там? Может, нужна помощь с чем-то?"
+]
+# Потоковые ответы (state/stream/) храним не дольше (секунды)
+STREAM_RETENTION = 24 * 3600
+# Номер вызова в процессе - для имени файла потокового ответа
+STREAM_SEQ = itertools.count(1)
+# Аренда: два таймаута (попытка + повтор после перезапуска) и запас (секунды)
+LEASE_MARGIN = 60
+
 
 class LifeOrchestrator:
-    def __init__(self):
-        self.state_file = Path("state/orchestrator_state.json")
+    def __init__(self, clock=None):
+        # Все решения по времени - через часы (симулятор подставляет виртуальные)
+        self.clock = clock or SystemClock()
+        self.state_file = Path("state/orchestrator_state.json")  # старый формат, для миграции
         self.state_file.parent.mkdir(exist_ok=True)
+        self.store = StateStore()
+        self.pid_file = Path("state/orchestrator.pid")
         self.load_state()
         
+        # Дедлайны проактивности по всем пользователям
+        self.proactive_scheduler = ProactiveScheduler()
+        for user_id in self.state['users_silence_time']:
+            self.schedule_proactive(user_id)
+        
+        # Гистограммы активности для адаптивной проверки сообщений
+        self.activity = ActivityModel(self.store)
+        if self.state['users_silence_time']:
+            self.activity.last_activity = datetime.fromisoformat(
+                max(self.state['users_silence_time'].values())
+            )
+        
+        # Прогретые процессы Claude (в разовом режиме не прогреваются)
+        # Общий с health monitor, watchdog и скриптами лимит вызовов claude
+        self.limiter = RateLimiter(self.store)
+        self.claude_pool = ClaudeWorkerPool(limiter=self.limiter)
+        self.failover = FailoverManager(self.store, self.limiter)
+        self.state_lock = threading.RLock()
+        self.batcher = ActionBatcher()
+        self.memory_index = MemoryIndex()
+        self.memory_index_refreshed_at = 0.0
+        self.logs_rotated_at = None
+        self.memory_compactor = MemoryCompactor()
+        self.context_cache = UserContextCache()
+        self.timeouts = AdaptiveTimeouts(self.store)
+        # Долгие задачи по частям с контрольными точками в state/jobs/
+        # Вытеснение и перегрузка пула - не сбой сегмента, просто пауза
+        self.job_runner = JobRunner(
+            self.run_job_segment, self.finish_job, pause_on=(Preempted, PoolBusy), clock=self.clock
+        )
+        # Накопленные метрики всех запусков (текущий процесс копит дельту в metrics)
+        self.metrics_totals = MetricsRegistry()
+        
+        # Очередь действий и таймеры резидентного режима
+        self.action_queue = deque()
+        # Пачки, которые сейчас выполняются: future -> batch
+        self.in_flight = {}
+        self.in_flight_lock = threading.Lock()
+        # Сообщения пришли, пока шла проверка: ещё одна - сразу после неё, не параллельно
+        self.recheck_messages = False
+        # Фон, которому не хватило воркеров: его возвращает в очередь только
+        # batch_done, чтобы цикл не крутился вхолостую
+        self.deferred_background = deque()
+        # Персистентная очередь с арендой: общая для пересекающихся запусков из cron
+        self.persistent_queue = ActionQueue(self.store)
+        self.wakeup = threading.Event()
+        self.running = False
+        self.next_background_at = 0.0
+        self.last_push_at = None
+        # Исход последнего вызова Claude в этом процессе (None - вызовов не было)
+        self.last_claude_outcome = None
+        
     def load_state(self):
         """Загружает состояние оркестратора"""
-        if self.state_file.exists():
-            with open(self.state_file, 'r') as f:
-                self.state = json.load(f)
-        else:
-            self.state = {
-                'last_message_check': None,
-                'last_proactive_message': None,
-                'last_deep_thinking': None,
-                'background_tasks_completed': 0,
-                'users_silence_time': {}
-            }
+        self.state = {
+            'last_message_check': None,
+            'last_proactive_message': None,
+            'last_deep_thinking': None,
+            'background_tasks_completed': 0,
+            'users_silence_time': {},
+            'users_last_proactive': {},
+            'users_unanswered_proactive': {}
+        }
+        
+        # Свой флаг: kv общий, и watchdog с life_daemon.sh пишут в него раньше
+        if not self.store.get('orchestrator.migrated') and self.state_file.exists():
+            self.migrate_legacy_state()
+        
+        for key in self.state:
+            if key in STATE_MAPS:
+                self.state[key] = self.store.get_map(key)
+            else:
+                self.state[key] = self.store.get(key, self.state[key])
+    
+    def migrate_legacy_state(self):
+        """Переносит orchestrator_state.json в хранилище (один раз)"""
+        with open(self.state_file, 'r') as f:
+            legacy = json.load(f)
+        
+        with self.store.transaction():
+            self.store.set('orchestrator.migrated', True)
+            # Оркестратор уже писал в хранилище - там состояние новее файла
+            if any(self.store.get(key) is not None for key in self.state if key not in STATE_MAPS):
+                return
+            for key, value in legacy.items():
+                if key in STATE_MAPS:
+                    for item_key, item_value in value.items():
+                        self.store.set_map_item(key, item_key, item_value)
+                else:
+                    self.store.set(key, value)
+        logging.info("Состояние перенесено из orchestrator_state.json в хранилище")
     
     def save_state(self):
-        """Сохраняет состояние"""
-        with open(self.state_file, 'w') as f:
-            json.dump(self.state, f, indent=2, default=str)
+        """Сохраняет скалярные поля состояния (словари пишутся построчно)"""
+        self.store.update({
+            key: value for key, value in self.state.items() if key not in STATE_MAPS
+        })
     
     def is_night_time(self):
         """Проверяет, ночь ли сейчас (1:00 - 6:00)"""
-        current_hour = datetime.now().hour
+        current_hour = self.clock.now().hour
         return 1 <= current_hour <= 6
     
     def is_evening_time(self):
         """Проверяет, вечер ли (22:00 - 23:59)"""
-        current_hour = datetime.now().hour
+        current_hour = self.clock.now().hour
         return 22 <= current_hour <= 23
     
     def get_user_silence_duration(self, user_id):
         """Возвращает длительность молчания пользователя"""
         if user_id in self.state['users_silence_time']:
             last_time = datetime.fromisoformat(self.state['users_silence_time'][user_id])
-            return (datetime.now() - last_time).total_seconds() / 60  # в минутах
+            return (self.clock.now() - last_time).total_seconds() / 60  # в минутах
         return 0
     
     def decide_action(self):
         """Решает, что делать в данный момент"""
-        current_time = datetime.now()
+        current_time = self.clock.now()
         
         # Ночное время - глубокие размышления
         if self.is_night_time():
+            # Сообщения ночью не ждут, пока закончится размышление
+            if self.should_check_messages():
+                return {
+                    'action': 'check_messages',
+                    'reason': 'Проверка новых сообщений'
+                }
+            
+            # Незаконченное размышление продолжаем со следующего сегмента
+            job = self.job_runner.active_job('deep_thinking')
+            if job:
+                return {
+                    'action': 'deep_thinking',
+                    'reason': f"Продолжение размышления ({job['step'] + 1}/{len(job['segments'])})",
+                    'params': {'job_id': job['id']}
+                }
+            
             # Проверяем, не делали ли мы это недавно
             if self.state['last_deep_thinking']:
                 last_thinking = datetime.fromisoformat(self.state['last_deep_thinking'])
@@ -72,14 +303,21 @@ class LifeOrchestrator:
                     return self.get_light_background_task()
             
             logging.info("Ночное время - запускаем глубокое размышление")
+            params = {
+                'mode': 'sequential_thinking',
+                'steps': DEEP_THINKING_STEPS,  # Длительное размышление
+                'topics': self.get_reflection_topics()
+            }
+            # Один id на час: пересекающиеся запуски подхватят одну и ту же задачу
+            job = self.job_runner.create(
+                f"deep_thinking-{current_time.strftime('%Y%m%d-%H')}", 'deep_thinking',
+                self.build_deep_thinking_segments(params)
+            )
+            params['job_id'] = job['id']
             return {
                 'action': 'deep_thinking',
                 'reason': 'Ночь - время для саморефлексии',
-                'params': {
-                    'mode': 'sequential_thinking',
-                    'steps': 50,  # Длительное размышление
-                    'topics': self.get_reflection_topics()
-                }
+                'params': params
             }
         
         # Проверяем новые сообщения
@@ -103,25 +341,91 @@ class LifeOrchestrator:
             return True
         
         last_check = datetime.fromisoformat(self.state['last_message_check'])
-        time_passed = (datetime.now() - last_check).total_seconds()
+        time_passed = (self.clock.now() - last_check).total_seconds()
+        
+        return time_passed >= self.message_check_interval()
+    
+    def message_check_interval(self):
+        """Интервал проверки сообщений в секундах"""
+        # О новых сообщениях сообщает мост - опрос только на всякий случай
+        if self.push_channel_active():
+            return PUSH_FALLBACK_INTERVAL
+        
+        # Когда накопилась история - интервал по активности людей
+        if self.activity.has_data():
+            return self.activity.next_interval(self.clock.now(), self.state['users_silence_time'])
         
         # Проверяем каждые 5 минут днем, каждые 30 минут ночью
-        interval = 300 if not self.is_night_time() else 1800
-        return time_passed >= interval
+        return 300 if not self.is_night_time() else 1800
+    
+    def record_user_activity(self, user_id, when=None):
+        """Запоминает последнюю активность пользователя"""
+        user_id = str(user_id)
+        when = when or self.clock.now()
+        self.state['users_silence_time'][user_id] = when.isoformat()
+        self.store.set_map_item('users_silence_time', user_id, when.isoformat())
+        # Человек ответил - проактивные сообщения снова по обычному расписанию
+        if self.state['users_unanswered_proactive'].pop(user_id, None):
+            self.store.delete_map_item('users_unanswered_proactive', user_id)
+        self.schedule_proactive(user_id)
+        self.activity.record(user_id, when)
+    
+    def schedule_proactive(self, user_id):
+        """Ставит пользователю ближайший момент проверки проактивности"""
+        unanswered = self.state['users_unanswered_proactive'].get(user_id, 0)
+        if unanswered >= PROACTIVE_MAX_UNANSWERED:
+            # Не навязываемся: вернёмся, когда человек напишет сам
+            self.proactive_scheduler.cancel(user_id)
+            return
+        
+        last_seen = datetime.fromisoformat(self.state['users_silence_time'][user_id])
+        due = last_seen + timedelta(minutes=PROACTIVE_CARE_SILENCE)
+        
+        last_proactive = self.state['users_last_proactive'].get(user_id)
+        if last_proactive:
+            cooldown = PROACTIVE_COOLDOWN * 2 ** max(0, unanswered - 1)
+            cooldown_end = datetime.fromisoformat(last_proactive) + timedelta(minutes=cooldown)
+            due = max(due, cooldown_end)
+        
+        self.proactive_scheduler.schedule(user_id, due.timestamp())
+    
+    def end_of_night(self):
+        """Момент, когда закончится ночь (7:00)"""
+        now = self.clock.now()
+        morning = datetime.combine(now.date(), time(7, 0))
+        return morning if morning > now else morning + timedelta(days=1)
     
     def check_proactive_needs(self):
         """Проверяет, нужно ли написать первой"""
-        # Получаем данные о молчании пользователей
-        # Здесь нужна интеграция с MCP для получения реальных данных
+        now = self.clock.now()
         
-        # Пример логики:
-        user_id = "365991821"  # Larry
+        # Достаём только тех, у кого наступил дедлайн
+        while True:
+            due_users = self.proactive_scheduler.pop_due(now.timestamp(), limit=1)
+            if not due_users:
+                return None
+            
+            user_id = due_users[0]
+            decision = self.evaluate_proactive(user_id, now)
+            if decision:
+                # Страховка: если действие не выполнится, вернёмся позже
+                retry = now + timedelta(minutes=PROACTIVE_RETRY)
+                self.proactive_scheduler.schedule(user_id, retry.timestamp())
+                return decision
+    
+    def evaluate_proactive(self, user_id, now):
+        """Решает, что делать с пользователем, чей дедлайн наступил"""
         silence_duration = self.get_user_silence_duration(user_id)
         
-        # Если молчание больше часа И это не ночь
-        if silence_duration > 60 and not self.is_night_time():
+        # Ночью не пишем - переносим на утро
+        if self.is_night_time():
+            self.proactive_scheduler.schedule(user_id, self.end_of_night().timestamp())
+            return None
+        
+        # Если молчание больше часа
+        if silence_duration > PROACTIVE_CARE_SILENCE:
             # Особые условия для вечера
-            if self.is_evening_time() and silence_duration > 30:
+            if self.is_evening_time():
                 return {
                     'action': 'proactive_care',
                     'reason': 'Вечернее время, проверяем как дела',
@@ -133,7 +437,7 @@ class LifeOrchestrator:
                 }
             
             # Обычная проактивная инициатива
-            if silence_duration > 90:
+            if silence_duration > PROACTIVE_MESSAGE_SILENCE:
                 return {
                     'action': 'proactive_message',
                     'reason': f'Молчание {int(silence_duration)} минут',
@@ -143,10 +447,16 @@ class LifeOrchestrator:
                     }
                 }
         
+        # Ещё рано - ждём следующего порога
+        last_seen = datetime.fromisoformat(self.state['users_silence_time'][user_id])
+        next_due = last_seen + timedelta(minutes=PROACTIVE_MESSAGE_SILENCE)
+        if next_due <= now:
+            next_due = now + timedelta(minutes=PROACTIVE_RETRY)
+        self.proactive_scheduler.schedule(user_id, next_due.timestamp())
         return None
     
     def get_background_task(self):
-        """Выбирает фоновую задачу"""
+        """Выбирает фоновую задачу: по ротации, пропуская те, чьи входы не менялись"""
         tasks = [
             {
                 'action': 'analyze_patterns',
@@ -171,15 +481,49 @@ class LifeOrchestrator:
         ]
         
         # Выбираем задачу по приоритету и ротации
-        task_index = self.state['background_tasks_completed'] % len(tasks)
-        selected_task = tasks[task_index]
+        self.refresh_memory_index()
+        start = self.state['background_tasks_completed'] % len(tasks)
+        for offset in range(len(tasks)):
+            selected_task = tasks[(start + offset) % len(tasks)]
+            if self.background_task_is_stale(selected_task['action']):
+                return {
+                    'action': selected_task['action'],
+                    'reason': selected_task['description'],
+                    'params': {}
+                }
         
         return {
-            'action': selected_task['action'],
-            'reason': selected_task['description'],
+            'action': 'idle',
+            'reason': 'Память не менялась с прошлых фоновых задач',
             'params': {}
         }
     
+    def background_task_is_stale(self, action):
+        """Изменилась ли память, от которой зависит задача, или истёк TTL"""
+        # Инкрементальной задаче без новых разговоров нечего делать даже по TTL
+        if action in INCREMENTAL_TASKS and not self.pending_conversations(action):
+            fresh = True
+        else:
+            memo = self.store.get_map_item('background_memo', action)
+            ttl = BACKGROUND_TTL.get(action, DEFAULT_BACKGROUND_TTL)
+            fresh = (
+                memo is not None
+                and self.clock.time() - memo['finished_at'] <= ttl
+                and memo['input_hash'] == self.memory_index.fingerprint(BACKGROUND_INPUTS[action])
+            )
+        if fresh:
+            metrics.inc('life_background_skipped_total', {'action': action},
+                        help="Фоновые задачи, пропущенные из-за неизменной памяти")
+        return not fresh
+    
+    def remember_background_result(self, action):
+        """Запоминает состояние памяти после задачи (вместе с её собственными правками)"""
+        self.refresh_memory_index(force=True)
+        self.store.set_map_item('background_memo', action, {
+            'input_hash': self.memory_index.fingerprint(BACKGROUND_INPUTS[action]),
+            'finished_at': self.clock.time()
+        })
+    
     def get_light_background_task(self):
         """Легкая фоновая задача для ночи"""
         return {
@@ -201,31 +545,127 @@ class LifeOrchestrator:
         ]
         
         # Выбираем тему по дню недели
-        day_index = datetime.now().weekday()
+        day_index = self.clock.now().weekday()
         return [topics[day_index % len(topics)]]
     
     def execute_action(self, decision):
         """Выполняет выбранное действие"""
+        with log_context(decision['action']):
+            self._execute_action(decision)
+    
+    def _execute_action(self, decision):
         action = decision['action']
         logging.info(f"Выполняю: {action} - {decision['reason']}")
         
-        # Формируем команду для Claude
+        started = time_module.monotonic()
+        
+        if action == 'idle':
+            return
+        
+        if action == 'deep_thinking':
+            # Долгое размышление - по сегменту за раз, с контрольными точками
+            output = self.run_deep_thinking(decision)
+            self.record_action_metrics(action, output is not None, started)
+            return
+        
+        if action == 'memory_cleanup':
+            # Механическая работа - без вызова Claude
+            output = self.run_memory_compaction()
+        else:
+            # Формируем команду для Claude
+            command = self.build_command(decision)
+            
+            # Выполняем через Claude CLI
+            output = self.run_claude_command(command, action, [decision])
+        
+        # Обновляем состояние
+        self.update_state_after_action(action, decision)
+        if output is not None:
+            self.record_action_success(decision)
+        self.record_action_metrics(action, output is not None, started)
+    
+    def record_action_metrics(self, action, ok, started):
+        """Счётчик и длительность действия, сброс метрик на диск"""
+        metrics.inc('life_actions_total', {'action': action, 'outcome': 'ok' if ok else 'failed'},
+                    help="Выполненные действия оркестратора")
+        metrics.observe('life_action_duration_seconds', time_module.monotonic() - started,
+                        {'action': action}, help="Время действия от решения до завершения")
+        self.export_metrics()
+    
+    def export_metrics(self):
+        """Сливает дельту процесса в общие итоги и пишет state/metrics.prom"""
+        totals = export_metrics(self.store)
+        if totals is not None:
+            self.metrics_totals.replace(totals.snapshot())
+    
+    def execute_batch(self, batch):
+        """Выполняет пачку совместимых действий одним вызовом Claude"""
+        if len(batch) == 1:
+            return self.execute_action(batch[0])
+        
+        with log_context('batch'):
+            self._execute_batch(batch)
+    
+    def _execute_batch(self, batch):
+        actions = ', '.join(decision['action'] for decision in batch)
+        logging.info(f"Выполняю пачкой ({len(batch)}): {actions}")
+        
+        started = time_module.monotonic()
+        commands = [self.build_command(decision) for decision in batch]
+        prompt = self.batcher.build_prompt(commands)
+        record_usage('batch', estimate_tokens(prompt))
+        output = self.run_claude_command(prompt, 'batch', batch)
+        metrics.inc('life_batched_actions_total', value=len(batch),
+                    help="Действия, выполненные в составе пачки")
+        
+        # Без ответа (сбой/fallback) ведём себя как при одиночных вызовах
+        if output is None:
+            for decision in batch:
+                self.update_state_after_action(decision['action'], decision)
+                self.record_action_metrics(decision['action'], False, started)
+            return
+        
+        results = self.batcher.split_response(output, len(batch))
+        for index, decision in enumerate(batch, 1):
+            if index in results:
+                self.update_state_after_action(decision['action'], decision)
+                self.record_action_success(decision)
+                self.record_action_metrics(decision['action'], True, started)
+            else:
+                # Claude пропустил задачу - повторим её отдельно
+                logging.warning(f"Нет ответа по {decision['action']} в пачке, повторим отдельно")
+                self.enqueue_action(dict(decision, no_batch=True))
+    
+    def build_command(self, decision):
+        """Строит промпт для действия в пределах бюджета токенов"""
+        action = decision['action']
+        prompt = PromptBudget(action)
         if action == 'check_messages':
-            command = self.build_check_messages_command()
+            prompt.add(self.build_check_messages_command())
+            # Сообщения, принятые напрямую, пока Claude был недоступен
+            inbox = self.store.get_map('direct_inbox')
+            if inbox:
+                # Все ключи уходят из входящих после ответа - ранние Claude видит только счётчиком
+                decision['inbox'] = sorted(inbox)
+                prompt.add(self.build_inbox_context(inbox))
+            for rank, user_id in enumerate(self.recent_active_users()):
+                self.add_user_context(prompt, user_id, rank)
         elif action == 'deep_thinking':
-            command = self.build_deep_thinking_command(decision['params'])
+            prompt.add(self.job_runner.segment_prompt(self.job_runner.load(decision['params']['job_id'])))
         elif action == 'proactive_message':
-            command = self.build_proactive_command(decision['params'])
+            prompt.add(self.build_proactive_command(decision['params']))
+            self.add_user_context(prompt, decision['params']['user_id'])
         elif action == 'proactive_care':
-            command = self.build_proactive_care_command(decision['params'])
+            prompt.add(self.build_proactive_care_command(decision['params']))
+            self.add_user_context(prompt, decision['params']['user_id'])
         else:
-            command = self.build_background_task_command(action, decision['params'])
-        
-        # Выполняем через Claude CLI
-        self.run_claude_command(command)
-        
-        # Обновляем состояние
-        self.update_state_after_action(action, decision)
+            prompt.add(self.build_background_task_command(action, decision['params']))
+            if action in INCREMENTAL_TASKS:
+                self.add_conversation_delta(prompt, decision)
+            # Задачам по людям сразу даём карту памяти, чтобы не обходить папки
+            if action in ('analyze_patterns', 'update_portrait'):
+                prompt.add(self.build_memory_map(), MEMORY_MAP_PRIORITY)
+        return prompt.render()
     
     def build_check_messages_command(self):
         """Строит команду проверки сообщений"""
@@ -235,13 +675,80 @@ class LifeOrchestrator:
 Если нет - выполни одну фоновую задачу из очереди.
 """
     
-    def build_deep_thinking_command(self, params):
-        """Строит команду для глубоких размышлений"""
+    def build_inbox_context(self, inbox):
+        """Блок с сообщениями, на которые пока был только короткий ответ
+
+        Берём INBOX_PROMPT_LIMIT последних по времени приёма, каждое не длиннее
+        INBOX_TEXT_CHARS; про более ранние - только сколько их было от кого.
+        """
+        keys = sorted(inbox, key=lambda key: (inbox[key].get('received', ''), key))
+        earlier, recent = keys[:-INBOX_PROMPT_LIMIT], keys[-INBOX_PROMPT_LIMIT:]
+        lines = ["", "Пока ты была недоступна, пришли сообщения (им ушёл только короткий ответ):"]
+        if earlier:
+            senders = Counter(inbox[key]['user_id'] for key in earlier)
+            counts = ", ".join(f"от {user_id} - {count}" for user_id, count in senders.items())
+            lines.append(f"- ещё {len(earlier)} более ранних сообщений ({counts}) - учти, что писали и раньше")
+        for key in recent:
+            message = inbox[key]
+            text = str(message.get('text') or '')
+            if len(text) > INBOX_TEXT_CHARS:
+                text = text[:INBOX_TEXT_CHARS] + "…"
+            lines.append(f"- от {message['user_id']} (чат {message['chat_id']}): {text}")
+        lines.append("Ответь на них по-настоящему.")
+        return "\n".join(lines) + "\n"
+    
+    def record_action_success(self, decision):
+        """После успешного ответа: чистим входящие, запоминаем фоновую задачу"""
+        # Убираем из входящих то, что попало в успешную проверку сообщений
+        for key in decision.get('inbox', []):
+            self.store.delete_map_item('direct_inbox', key)
+        for key, done in decision.get('offsets', {}).items():
+            self.store.set_map_item('task_offsets', key, done)
+        if decision['action'] in BACKGROUND_INPUTS:
+            self.remember_background_result(decision['action'])
+    
+    def recent_active_users(self):
+        """Последние собеседники - скорее всего, ответ нужен им"""
+        cutoff = (self.clock.now() - timedelta(hours=RECENT_USERS_HOURS)).isoformat()
+        # Вызывается из воркеров, пока сокет и другие воркеры отмечают активность
+        with self.state_lock:
+            recent = heapq.nlargest(
+                RECENT_USERS_LIMIT,
+                self.state['users_silence_time'].items(),
+                key=lambda item: item[1]
+            )
+        return [user_id for user_id, last_seen in recent if last_seen >= cutoff]
+    
+    def add_user_context(self, prompt, user_id, rank=0):
+        """Контекст пользователя из кэша: essence важнее всего, patterns - меньше
+
+        Приоритет растёт с номером файла, а среди файлов одного вида - с
+        номером пользователя, так что при нехватке бюджета первыми уходят
+        patterns дальних собеседников.
+        """
+        sections = self.context_cache.sections(user_id)
+        if not sections:
+            return
+        prompt.add(f"\nЧто я знаю о пользователе {user_id}:\n", CONTEXT_PRIORITY + rank)
+        for index, (_, text) in enumerate(sections):
+            prompt.add(text + "\n\n", CONTEXT_PRIORITY * (index + 1) + rank)
+    
+    def build_deep_thinking_segments(self, params):
+        """Команды для глубоких размышлений - по сегменту на DEEP_THINKING_SEGMENT шагов"""
         topic = params['topics'][0]
         steps = params['steps']
+        segments = []
         
-        return f"""
-Используй sequential_thinking для глубокого размышления ({steps} шагов).
+        for first in range(1, steps + 1, DEEP_THINKING_SEGMENT):
+            last = min(steps, first + DEEP_THINKING_SEGMENT - 1)
+            if last < steps:
+                finish = "В конце кратко запиши, к чему пришла - следующая часть продолжит отсюда."
+            else:
+                finish = """Это последняя часть:
+4. Сохрани ключевые инсайты в Memory/insights/
+5. Обнови понимание себя если что-то важное поняла"""
+            segments.append(f"""
+Используй sequential_thinking для глубокого размышления (шаги {first}-{last} из {steps}).
 
 Тема: {topic}
 
@@ -249,11 +756,35 @@ class LifeOrchestrator:
 1. Размышляй свободно и глубоко
 2. Ищи неочевидные связи
 3. Если нужно - исследуй через WebSearch
-4. Сохрани ключевые инсайты в Memory/insights/
-5. Обнови понимание себя если что-то важное поняла
+{finish}
 
 Это твоё время для роста. Будь смелой в мыслях.
-"""
+""")
+        return segments
+    
+    def run_deep_thinking(self, decision):
+        """Выполняет следующий сегмент размышления (в резидентном режиме - будит поток задач)"""
+        if self.running:
+            self.job_runner.submit()
+            return ''
+        
+        job = self.job_runner.load(decision['params']['job_id'])
+        output = None
+        if job and job['status'] == 'active':
+            output = self.job_runner.run_segment(job)
+        # Повторы сегментов считает сам runner - ключ очереди закрываем всегда
+        if decision.get('dedupe_key'):
+            self.persistent_queue.complete(decision['dedupe_key'])
+        return output
+    
+    def run_job_segment(self, prompt, on_chunk):
+        """Сегмент долгой задачи через Claude; фрагменты ответа сразу в контрольную точку"""
+        with log_context('deep_thinking'):
+            return self.run_claude_command(prompt, 'deep_thinking', on_chunk=on_chunk)
+    
+    def finish_job(self, job):
+        """Размышление закончено целиком"""
+        self.update_state_after_action(job['action'], {'action': job['action'], 'params': {}})
     
     def build_proactive_command(self, params):
         """Строит команду для проактивного сообщения"""
@@ -297,9 +828,9 @@ class LifeOrchestrator:
         """Строит команду для фоновой задачи"""
         commands = {
             'analyze_patterns': """
-Проанализируй паттерны общения с пользователями за последнюю неделю.
+Проанализируй паттерны общения в новых разговорах (ниже), дополняя прошлые выводы.
 Найди повторяющиеся темы, эмоциональные паттерны, временные закономерности.
-Сохрани выводы в Memory/patterns/
+Сохрани выводы в Memory/patterns/ и в patterns.md пользователя.
 """,
             'research_interests': """
 Исследуй через WebSearch темы, которые упоминали пользователи.
@@ -307,155 +838,749 @@ class LifeOrchestrator:
 Подготовь 2-3 темы для будущих разговоров.
 """,
             'update_portrait': """
-Обнови портреты пользователей на основе последних взаимодействий.
-Добавь новые наблюдения, уточни характеристики.
+Обнови портреты пользователей по новым разговорам (ниже).
+Добавь новые наблюдения к текущему портрету, уточни характеристики.
 Используй анализ эмоций и тем.
 """,
             'prepare_content': """
 Подготовь персонализированный контент для пользователей.
 Это может быть: интересный факт, мотивирующая мысль, полезный совет.
 Учитывай их текущие заботы и интересы.
-""",
-            'memory_cleanup': """
-Проведи легкую оптимизацию памяти.
-Удали дубликаты, структурируй заметки, обнови индексы.
-Работай тихо и аккуратно.
 """
         }
         
         return commands.get(action, "Выполни базовую фоновую задачу.")
     
-    def run_claude_command(self, command):
-        """Выполняет команду через Claude CLI"""
+    def pending_conversations(self, action):
+        """Разговоры с необработанным текстом: {user_id: [файлы, старые первыми]}"""
+        self.refresh_memory_index()
+        offsets = self.store.get_map('task_offsets')
+        pending = {}
+        for user_id in self.memory_index.user_ids():
+            files = []
+            for f in self.memory_index.user_files(user_id, kind='conversation'):
+                # Архивы - уже обработанное прошлое, перезаписываются при сжатии
+                if '/archive/' in f['path']:
+                    continue
+                done = offsets.get(f"{action}:{f['path']}")
+                if done and done['sha256'] == f['sha256'] and done['complete']:
+                    continue
+                files.append(f)
+            if files:
+                pending[user_id] = sorted(files, key=lambda f: (f['mtime_ns'], f['path']))
+        return pending
+    
+    def add_conversation_delta(self, prompt, decision):
+        """Новый текст разговоров и прошлые выводы по каждому пользователю
+
+        По каждому файлу помним, сколько символов уже отдано (map task_offsets),
+        и отдаём только продолжение: дописанный разговор не уходит заново с
+        начала, а не влезшее в лимит остаётся на следующий запуск. Если начало
+        файла переписали, он отдаётся с начала. Смещения сдвигаются только
+        после успешного ответа (decision['offsets']).
+        """
+        action = decision['action']
+        pending = self.pending_conversations(action)
+        if not pending:
+            prompt.add("\nНовых разговоров с прошлого раза нет.\n")
+            return
+        
+        offsets = self.store.get_map('task_offsets')
+        budget = DELTA_MAX_CHARS
+        new_offsets = {}
+        for rank, (user_id, files) in enumerate(sorted(pending.items())):
+            if budget <= 0:
+                break
+            prompt.add(f"\nНовые разговоры с пользователем {user_id}:\n")
+            for f in files:
+                if budget <= 0:
+                    break
+                key = f"{action}:{f['path']}"
+                text = self.memory_index.read(f['path']) or ''
+                start = self.processed_offset(offsets.get(key), text)
+                chunk = text[start:start + min(DELTA_FILE_CHARS, budget)]
+                complete = start + len(chunk) >= len(text)
+                if not complete and '\n' in chunk:
+                    # Режем по строке - остаток целиком уйдёт в следующий раз
+                    chunk = chunk[:chunk.rindex('\n') + 1]
+                end = start + len(chunk)
+                
+                if chunk.strip():
+                    header = f"--- {f['path']}" + (" (продолжение)" if start else "")
+                    tail = "" if complete else "…\n"
+                    prompt.add(f"{header}\n{chunk.strip()}\n{tail}")
+                    budget -= len(chunk)
+                new_offsets[key] = {
+                    'offset': end,
+                    'prefix': hashlib.sha256(text[:end].encode()).hexdigest(),
+                    'sha256': f['sha256'],
+                    'complete': complete,
+                }
+            
+            # Прошлые выводы - чтобы дополнять, а не переписывать заново
+            summary = [text for name, text in self.context_cache.sections(user_id)
+                       if name in INCREMENTAL_TASKS[action]]
+            if summary:
+                prompt.add("Прошлые выводы:\n" + "\n\n".join(summary) + "\n",
+                           CONTEXT_PRIORITY + rank)
+        decision['offsets'] = new_offsets
+    
+    def processed_offset(self, done, text):
+        """С какого символа файл ещё не отдан (0 - если начало переписали)"""
+        if not done or done['offset'] > len(text):
+            return 0
+        prefix = hashlib.sha256(text[:done['offset']].encode()).hexdigest()
+        return done['offset'] if prefix == done['prefix'] else 0
+    
+    def refresh_memory_index(self, force=False):
+        """Обновляет индекс памяти (только изменившиеся файлы)"""
+        if not force and self.clock.time() - self.memory_index_refreshed_at < MEMORY_INDEX_REFRESH:
+            return
         try:
-            # Проверяем, есть ли активная сессия
-            result = subprocess.run(
-                ['claude', '--no-markdown'],
-                input=command,
-                text=True,
-                capture_output=True,
-                timeout=120  # 2 минуты таймаут
-            )
+            self.memory_index.refresh()
+            self.memory_index_refreshed_at = self.clock.time()
+        except Exception as e:
+            logging.error(f"Ошибка обновления индекса памяти: {str(e)}")
+    
+    def rotate_logs(self):
+        """Ротация общих логов - только отсюда, не из каждого пишущего процесса"""
+        now = self.clock.time()
+        if self.logs_rotated_at is not None and now - self.logs_rotated_at < LOG_ROTATE_INTERVAL:
+            return
+        self.logs_rotated_at = now
+        try:
+            for name in rotate_logs():
+                logging.info(f"Лог {name} ротирован")
+        except OSError as e:
+            logging.error(f"Ошибка ротации логов: {str(e)}")
+    
+    def run_memory_compaction(self):
+        """Сжатие памяти (дубликаты, архивы, лимиты, INDEX.md); None при ошибке"""
+        try:
+            stats = self.memory_compactor.compact()
+        except Exception as e:
+            logging.error(f"Ошибка сжатия памяти: {str(e)}")
+            return None
+        self.refresh_memory_index(force=True)
+        return str(stats)
+    
+    def build_memory_map(self):
+        """Короткая карта памяти по пользователям из индекса"""
+        self.refresh_memory_index()
+        lines = ["", "Память по пользователям (из индекса):"]
+        for user_id in self.memory_index.user_ids():
+            files = self.memory_index.user_files(user_id)
+            conversations = sum(1 for f in files if f['kind'] == 'conversation')
+            kinds = sorted({f['kind'] for f in files if f['kind'] != 'conversation'})
+            lines.append(f"- {user_id}: {', '.join(kinds) or 'нет файлов'}; разговоров: {conversations}")
+        lines.append("Поиск по памяти: python3 autonomy/memory_index.py search \"запрос\" [--user ID]")
+        return "\n".join(lines) + "\n"
+    
+    def run_claude_command(self, command, action='unknown', decisions=(), on_chunk=None):
+        """Выполняет команду через Claude CLI, возвращает ответ или None
+
+        decisions - исходные решения, на случай прямого выполнения без Claude;
+        on_chunk - дополнительный приёмник законченных фрагментов ответа.
+        """
+        labels = {'action': action}
+        # Таймаут по истории этого действия, а не одна константа
+        timeout = self.timeouts.timeout_for(action)
+        priority = self.action_priority(decisions) if decisions else ACTION_PRIORITY.get(action, PRIORITY_BACKGROUND)
+        started = time_module.monotonic()
+        try:
+            # Отправляем команду на прогретый воркер, ответ читаем потоком
+            with metrics.timer('life_claude_cli_seconds', labels, help="Время вызова Claude CLI"):
+                result = self.claude_pool.run(
+                    command, timeout=timeout, on_chunk=self.make_stream_sink(action, started, on_chunk),
+                    priority=priority
+                )
             
             if result.returncode == 0:
                 logging.info("Команда выполнена успешно")
+                self.record_claude_outcome(True)
+                self.timeouts.record(action, time_module.monotonic() - started)
+                return result.stdout
             else:
                 logging.error(f"Ошибка выполнения: {result.stderr}")
+                self.record_claude_outcome(False)
+                metrics.inc('life_claude_errors_total', labels, help="Ошибки Claude CLI")
                 # Попытка перезапустить сессию
                 self.restart_claude_session()
                 
-        except subprocess.TimeoutExpired:
-            logging.error("Таймаут выполнения команды")
+        except subprocess.TimeoutExpired as e:
+            logging.error(f"Таймаут выполнения команды ({timeout} с)")
+            self.record_claude_outcome(False)
+            self.timeouts.record(action, timeout, timed_out=True)
+            self.save_partial_output(action, e.output)
+            metrics.inc('life_claude_timeouts_total', labels, help="Таймауты Claude CLI")
+        except PoolBusy as e:
+            # Перегрузка пула или лимит вызовов - не сбой Claude, пусть вызывающий подождёт
+            logging.info(f"Claude занят, действие отложено: {str(e)}")
+            raise
+        except Preempted:
+            # Уступили воркер более важному действию - вызывающий вернёт в очередь
+            logging.info(f"{action} прервано ради более важного действия")
+            metrics.inc('life_preemptions_total', labels, help="Действия, прерванные ради более важных")
+            raise
         except Exception as e:
             logging.error(f"Ошибка: {str(e)}")
+            self.record_claude_outcome(False)
+            metrics.inc('life_claude_errors_total', labels, help="Ошибки Claude CLI")
             # Если Claude недоступен, пытаемся перезапустить
             if self.restart_claude_session():
                 # Повторная попытка после перезапуска
                 try:
-                    result_retry = subprocess.run(
-                        ['claude', '--no-markdown'],
-                        input=command,
-                        text=True,
-                        capture_output=True,
-                        timeout=120
+                    result_retry = self.claude_pool.run(
+                        command, timeout=timeout, on_chunk=self.make_stream_sink(action, started, on_chunk),
+                        priority=priority
                     )
                     if result_retry.returncode == 0:
                         logging.info("Команда выполнена после перезапуска")
+                        self.record_claude_outcome(True)
+                        return result_retry.stdout
                     else:
                         # Если всё равно не работает - fallback
-                        self.execute_direct_action(command)
+                        self.execute_direct_action(decisions)
+                        metrics.inc('life_direct_fallbacks_total', labels, help="Переходы на прямое выполнение")
                 except:
-                    self.execute_direct_action(command)
+                    self.execute_direct_action(decisions)
+                    metrics.inc('life_direct_fallbacks_total', labels, help="Переходы на прямое выполнение")
             else:
                 # Если перезапуск не помог - fallback
-                self.execute_direct_action(command)
+                self.execute_direct_action(decisions)
+                metrics.inc('life_direct_fallbacks_total', labels, help="Переходы на прямое выполнение")
+    
+    def make_stream_sink(self, action, started, on_chunk=None):
+        """Приёмник законченных фрагментов ответа: state/stream/<action>-<pid>-<n>.txt
+
+        У каждого вызова свой файл: одно действие может идти параллельно на
+        нескольких воркерах и в пересекающихся запусках.
+        """
+        stream_dir = STATE_DIR / 'stream'
+        stream_dir.mkdir(parents=True, exist_ok=True)
+        self.prune_stream_files(stream_dir)
+        path = stream_dir / f"{action}-{os.getpid()}-{next(STREAM_SEQ)}.txt"
+        first_chunk = []
+        
+        def sink(chunk):
+            if not first_chunk:
+                first_chunk.append(True)
+                metrics.observe('life_claude_first_chunk_seconds', time_module.monotonic() - started,
+                                {'action': action}, help="Время до первого законченного фрагмента ответа")
+            with open(path, 'a') as f:
+                f.write(chunk + "\n")
+            if on_chunk:
+                on_chunk(chunk)
+            # Фрагменты читает поток пула - подписываем действие явно
+            with log_context(action):
+                logging.info(f"Фрагмент ответа: {len(chunk)} символов")
+        
+        return sink
+    
+    def prune_stream_files(self, stream_dir):
+        """Удаляет потоковые ответы старше STREAM_RETENTION"""
+        cutoff = time_module.time() - STREAM_RETENTION
+        for old in stream_dir.glob('*.txt'):
+            try:
+                if old.stat().st_mtime < cutoff:
+                    old.unlink()
+            except OSError:
+                pass
+    
+    def save_partial_output(self, action, output):
+        """Сохраняет то, что Claude успел сделать до таймаута"""
+        if not output:
+            return
+        if isinstance(output, bytes):
+            output = output.decode('utf-8', errors='replace')
+        partial_dir = STATE_DIR / 'partial'
+        partial_dir.mkdir(parents=True, exist_ok=True)
+        path = partial_dir / f"{action}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.txt"
+        path.write_text(output)
+        logging.info(f"Частичный ответ сохранён: {path}")
+    
+    def record_claude_outcome(self, ok):
+        """Исход реального вызова - по нему health monitor судит о здоровье"""
+        # Пульс пишется по настоящему времени: health monitor сверяет его с ним
+        self.store.record_claude_outcome(ok)
+        self.last_claude_outcome = ok
+        if ok:
+            self.failover.record_success()
+    
+    def push_channel_active(self):
+        """Был ли недавно сигнал о новом сообщении от Telegram моста"""
+        return (self.last_push_at is not None
+                and self.clock.time() - self.last_push_at < PUSH_ACTIVE_WINDOW)
+    
+    def handle_wake(self, args):
+        """WAKE [user_id]: пришло новое сообщение - проверяем сразу"""
+        self.last_push_at = self.clock.time()
+        if args:
+            with self.state_lock:
+                self.record_user_activity(args[0])
+        
+        with self.in_flight_lock:
+            # Идущая проверка могла не увидеть это сообщение - повторим после неё
+            checking = self.messages_in_flight()
+            if checking:
+                self.recheck_messages = True
+        already_queued = any(d['action'] == 'check_messages' for d in list(self.action_queue))
+        if not checking and not already_queued:
+            self.enqueue_wake_check()
+        logging.info(f"Получен сигнал о новом сообщении {args[0] if args else ''}".rstrip())
+        return {'ok': True, 'queued': not checking and not already_queued, 'recheck': checking}
     
-    def execute_direct_action(self, command):
-        """Выполняет действие напрямую через Python когда Claude недоступен"""
+    def enqueue_wake_check(self):
+        self.enqueue_action({
+            'action': 'check_messages',
+            'reason': 'Сигнал о новом сообщении',
+            # Каждый сигнал - отдельное сообщение, не дубликат опроса
+            'dedupe_key': f"check_messages:wake:{time_module.time_ns()}"
+        })
+    
+    def messages_in_flight(self):
+        """Идёт ли проверка сообщений (вызывать под in_flight_lock)"""
+        return any(d['action'] == 'check_messages' for batch in self.in_flight.values() for d in batch)
+    
+    def handle_seen(self, args):
+        """SEEN user_id: отметить активность без немедленной проверки"""
+        if not args:
+            return {'ok': False, 'error': 'user_id required'}
+        with self.state_lock:
+            self.record_user_activity(args[0])
+        return {'ok': True}
+    
+    def handle_ping(self, args):
+        """Ответ на PING через управляющий сокет"""
+        return {
+            'ok': True,
+            'pid': os.getpid(),
+            'queue': len(self.action_queue),
+            'heartbeat': self.store.get('health.heartbeat'),
+            # Сам ещё не вызывал Claude - судить не о чем, пусть решает следующий уровень
+            'claude_healthy': None if self.last_claude_outcome is None
+            else self.store.get('health.consecutive_failures', 0) == 0
+        }
+    
+    def execute_direct_action(self, decisions):
+        """Выполняет действия напрямую через Telegram клиент, когда Claude недоступен"""
         logging.info("Выполняю действие напрямую без Claude...")
         
-        try:
-            # Подключаем Telegram MCP напрямую
-            import sys
-            sys.path.append('/Users/larry/Claude/TG_BRIDGE/TG_MINIMAL/src')
-            from telegram_live_mcp.server import check_telegram_messages, send_telegram_message
-            
-            # Простая проверка сообщений
-            if "Проверь новые сообщения" in command:
-                result = check_telegram_messages(transcribe_audio=True, include_context=True)
-                if result and 'new_messages' in result:
-                    logging.info(f"Найдено {len(result['new_messages'])} новых сообщений")
-                    # Здесь можно добавить простую логику ответа
-                else:
-                    logging.info("Новых сообщений нет")
-            
-            # Проактивное сообщение
-            elif "проактивное сообщение" in command:
-                # Простое приветствие
-                messages = [
-                    "Привет! Как дела? Что-то давно не общались",
-                    "Эй, всё в порядке? Думала о тебе",
-                    "Как ты там? Может, нужна помощь с чем-то?"
-                ]
-                import random
-                msg = random.choice(messages)
-                send_telegram_message(365991821, msg)
-                logging.info("Отправлено проактивное сообщение")
-                
-        except Exception as e:
-            logging.error(f"Ошибка прямого выполнения: {str(e)}")
+        client = get_telegram_client(self.store)
+        if client is None:
+            return
+        
+        for decision in decisions:
+            try:
+                if decision['action'] == 'check_messages':
+                    self.direct_check_messages(client)
+                elif decision['action'] in ['proactive_message', 'proactive_care']:
+                    user_id = decision['params']['user_id']
+                    client.send_message(user_id, random.choice(DIRECT_PROACTIVE_MESSAGES))
+                    logging.info(f"Отправлено проактивное сообщение {user_id}")
+            except Exception as e:
+                logging.error(f"Ошибка прямого выполнения: {str(e)}")
+    
+    def direct_check_messages(self, client):
+        """Забирает новые сообщения, отмечает активность и коротко отвечает
+
+        Сами сообщения копятся в map 'direct_inbox' - на них ответит следующая
+        успешная проверка через Claude.
+        """
+        messages = client.get_updates()
+        if not messages:
+            logging.info("Новых сообщений нет")
+            return
+        logging.info(f"Найдено {len(messages)} новых сообщений")
+        
+        now = self.clock.now()
+        to_ack = {}
+        with self.state_lock:
+            for message in messages:
+                self.record_user_activity(message['user_id'])
+                self.store.set_map_item(
+                    'direct_inbox', f"{message['chat_id']}:{message['update_id']}",
+                    dict(message, received=now.isoformat())
+                )
+                to_ack[str(message['chat_id'])] = message['chat_id']
+        
+        # Один короткий ответ на чат, не чаще раза в DIRECT_ACK_COOLDOWN
+        for key, chat_id in to_ack.items():
+            last_ack = self.store.get_map_item('direct_acked', key)
+            if last_ack and now - datetime.fromisoformat(last_ack) < timedelta(minutes=DIRECT_ACK_COOLDOWN):
+                continue
+            client.send_message(chat_id, DIRECT_ACK_TEXT)
+            self.store.set_map_item('direct_acked', key, now.isoformat())
     
     def restart_claude_session(self):
-        """Пытается перезапустить Claude сессию"""
+        """Восстанавливает сессию Claude: резерв, backoff, размыкание цепи"""
         logging.info("Попытка перезапуска Claude сессии...")
-        try:
-            # Используем скрипт start для перезапуска
-            result = subprocess.run(
-                ['./start', '--force', '--quiet'],
-                capture_output=True,
-                text=True,
-                timeout=30,
-                cwd=Path(__file__).parent
-            )
-            
-            if result.returncode == 0:
-                logging.info("Claude сессия перезапущена через start")
-                return True
-            else:
-                logging.error(f"Не удалось перезапустить Claude: {result.stderr}")
-                return False
-        except Exception as e:
-            logging.error(f"Ошибка перезапуска: {str(e)}")
-            return False
+        ok = self.failover.recover('orchestrator')
+        metrics.inc('life_claude_restarts_total', {'result': 'ok' if ok else 'failed'},
+                    help="Перезапуски сессии Claude")
+        return ok
     
     def update_state_after_action(self, action, decision):
         """Обновляет состояние после выполнения действия"""
-        now = datetime.now().isoformat()
+        with self.state_lock:
+            self._update_state_after_action(action, decision)
+        if decision.get('dedupe_key'):
+            self.persistent_queue.complete(decision['dedupe_key'])
+    
+    def _update_state_after_action(self, action, decision):
+        now = self.clock.now().isoformat()
+        changes = {}
         
         if action == 'check_messages':
-            self.state['last_message_check'] = now
+            changes['last_message_check'] = now
         elif action == 'deep_thinking':
-            self.state['last_deep_thinking'] = now
+            changes['last_deep_thinking'] = now
         elif action in ['proactive_message', 'proactive_care']:
-            self.state['last_proactive_message'] = now
-        elif action.startswith('analyze_') or action in ['research_interests', 'update_portrait']:
-            self.state['background_tasks_completed'] += 1
+            changes['last_proactive_message'] = now
+            user_id = decision['params']['user_id']
+            self.state['users_last_proactive'][user_id] = now
+            self.store.set_map_item('users_last_proactive', user_id, now)
+            unanswered = self.state['users_unanswered_proactive'].get(user_id, 0) + 1
+            self.state['users_unanswered_proactive'][user_id] = unanswered
+            self.store.set_map_item('users_unanswered_proactive', user_id, unanswered)
+            self.schedule_proactive(user_id)
+        elif action in BACKGROUND_INPUTS:
+            # Считаем все задачи ротации, иначе она застревает на prepare_content
+            changes['background_tasks_completed'] = self.state['background_tasks_completed'] + 1
+        
+        # Пишем только изменившиеся ключи
+        self.state.update(changes)
+        if changes:
+            self.store.update(changes)
+    
+    def action_dedupe_key(self, decision):
+        """Ключ дедупликации: версия состояния, которое действие обновит
+
+        Пока первое выполнение не записало состояние, пересекающийся запуск
+        получит тот же ключ и не возьмёт действие повторно.
+        """
+        if decision.get('dedupe_key'):
+            return decision['dedupe_key']
         
-        self.save_state()
+        action = decision['action']
+        if action == 'check_messages':
+            version = self.state['last_message_check']
+        elif action == 'deep_thinking':
+            # Каждая попытка каждого сегмента - своё действие
+            job = self.job_runner.load(decision['params']['job_id']) or {}
+            version = f"{decision['params']['job_id']}:{job.get('step')}:{job.get('attempts')}"
+        elif action in ['proactive_message', 'proactive_care']:
+            user_id = decision['params']['user_id']
+            version = f"{user_id}:{self.state['users_last_proactive'].get(user_id)}"
+        else:
+            # Не все фоновые задачи двигают счётчик - добавляем час
+            version = f"{self.state['background_tasks_completed']}:{self.clock.now().strftime('%Y-%m-%dT%H')}"
+        return f"{action}:{version}"
+    
+    def lease_seconds(self, action):
+        """На сколько арендуем действие"""
+        return self.timeouts.timeout_for(action) * 2 + LEASE_MARGIN
+    
+    def claim_action(self, decision):
+        """Ставит действие в персистентную очередь и берёт в аренду
+
+        False - такое действие уже выполнено или выполняется другим запуском.
+        """
+        key = self.action_dedupe_key(decision)
+        ttl = ACTION_TTL.get(decision['action'], DEFAULT_ACTION_TTL)
+        self.persistent_queue.enqueue(key, decision, ttl)
+        if self.persistent_queue.lease(self.lease_seconds(decision['action']), key=key) is None:
+            logging.info(f"Пропускаю {decision['action']}: уже выполнено или выполняется ({key})")
+            metrics.inc('life_duplicate_actions_total', {'action': decision['action']},
+                        help="Действия, отброшенные как дубликаты")
+            return False
+        decision['dedupe_key'] = key
+        return True
+    
+    def defer_action(self, decision):
+        """Возвращает действие в очередь без траты попытки"""
+        if decision.get('dedupe_key'):
+            self.persistent_queue.defer(decision['dedupe_key'])
+    
+    def release_action(self, decision):
+        """Возвращает действие в очередь после сбоя"""
+        if decision.get('dedupe_key'):
+            self.persistent_queue.release(decision['dedupe_key'])
     
     def run(self):
         """Основной цикл работы"""
         logging.info("=== Life Orchestrator запущен ===")
+        self.persistent_queue.purge()
+        self.rotate_logs()
         
-        # Принимаем решение
-        decision = self.decide_action()
+        # Сначала - действие, брошенное упавшим запуском
+        decision = self.persistent_queue.lease(self.lease_seconds)
+        if decision:
+            logging.info(f"Подхватываю брошенное действие {decision['dedupe_key']}")
+        else:
+            # Принимаем решение
+            decision = self.decide_action()
+            if decision['action'] == 'idle':
+                logging.info(f"Нечего делать: {decision['reason']}")
+                logging.info("=== Цикл завершен ===")
+                return
+            if not self.claim_action(decision):
+                logging.info("=== Цикл завершен ===")
+                return
         
         # Выполняем
-        self.execute_action(decision)
+        try:
+            self.execute_action(decision)
+        except (PoolBusy, Preempted) as e:
+            # Лимит вызовов или занятый пул - не сбой: действие (и сегмент
+            # размышления с его контрольной точкой) подхватит следующий запуск
+            logging.info(f"{decision['action']} отложено: {str(e)}")
+            self.defer_action(decision)
+        except Exception:
+            self.release_action(decision)
+            raise
         
         logging.info("=== Цикл завершен ===")
+    
+    def enqueue_action(self, decision):
+        """Ставит действие в очередь резидентного режима и будит цикл"""
+        self.action_queue.append(decision)
+        self.wakeup.set()
+    
+    def seconds_until_next_decision(self):
+        """Считает, когда пора принимать следующее решение
+
+        Отложенный фон (deferred_background) сюда не входит: его разбудит batch_done.
+        """
+        if self.action_queue:
+            return 0
+        
+        delays = [DAEMON_MAX_SLEEP]
+        
+        # Ближайшая проверка сообщений
+        if self.state['last_message_check']:
+            last_check = datetime.fromisoformat(self.state['last_message_check'])
+            passed = (self.clock.now() - last_check).total_seconds()
+            delays.append(self.message_check_interval() - passed)
+        else:
+            delays.append(0)
+        
+        # Ближайший проактивный дедлайн (куча общая с потоками воркеров и сокета)
+        with self.state_lock:
+            next_due = self.proactive_scheduler.next_due()
+        if next_due is not None:
+            delays.append(next_due - self.clock.time())
+        
+        # Ближайшая фоновая задача
+        delays.append(self.next_background_at - self.clock.time())
+        
+        return max(DAEMON_MIN_SLEEP, min(delays))
+    
+    def action_priority(self, decisions):
+        """Класс приоритета пачки - по самому важному действию в ней"""
+        return min(ACTION_PRIORITY.get(decision['action'], PRIORITY_BACKGROUND) for decision in decisions)
+    
+    def drain_action_queue(self):
+        """Отправляет накопившиеся действия пачками на воркеры пула, не дожидаясь их
+
+        Важные действия уходят первыми и без ограничений, фоновых одновременно
+        не больше, чем воркеров. Если пул занят фоном, пришедшее сообщение
+        вытеснит фоновую задачу, и та вернётся в очередь (batch_done).
+        """
+        if not self.running:
+            return
+        
+        queued = []
+        while self.action_queue:
+            queued.append(self.action_queue.popleft())
+        
+        with self.in_flight_lock:
+            in_flight_keys = {d.get('dedupe_key') for batch in self.in_flight.values() for d in batch}
+            in_flight_keys.update(d.get('dedupe_key') for d in self.deferred_background)
+            checking = self.messages_in_flight()
+        
+        pending = []
+        for decision in queued:
+            # То же действие уже выполняется в этом процессе - второй раз не берём
+            if not decision.get('dedupe_key') and self.action_dedupe_key(decision) in in_flight_keys:
+                continue
+            # Проверки сообщений не идут параллельно: две ответили бы на одно сообщение
+            if decision['action'] == 'check_messages' and checking:
+                with self.in_flight_lock:
+                    self.recheck_messages = True
+                continue
+            if self.claim_action(decision):
+                pending.append(decision)
+                checking = checking or decision['action'] == 'check_messages'
+        # Важное - вперёд, внутри класса порядок сохраняется
+        pending.sort(key=lambda decision: self.action_priority([decision]))
+        
+        for batch in self.batcher.coalesce(pending):
+            with self.in_flight_lock:
+                # Считаем под тем же замком, под которым batch_done освобождает место
+                if (self.action_priority(batch) >= PRIORITY_BACKGROUND
+                        and self.background_running() >= self.claude_pool.size):
+                    # Фон ждёт, пока закончится другая пачка
+                    self.deferred_background.extend(batch)
+                    continue
+                future = self.action_executor.submit(self.execute_batch, batch)
+                self.in_flight[future] = batch
+            future.add_done_callback(self.batch_done)
+    
+    def background_running(self):
+        """Сколько фоновых пачек выполняется (вызывать под in_flight_lock)"""
+        return sum(1 for batch in self.in_flight.values() if self.action_priority(batch) >= PRIORITY_BACKGROUND)
+    
+    def batch_done(self, future):
+        """Пачка закончилась: перегрузку и вытеснение - обратно в очередь"""
+        error = future.exception()
+        deferred = isinstance(error, (PoolBusy, Preempted))
+        with self.in_flight_lock:
+            # Продолжение ставим в очередь до снятия пачки: пачка всегда видна
+            # либо среди выполняемых, либо в очереди
+            batch = self.in_flight.get(future, [])
+            if any(decision['action'] == 'check_messages' for decision in batch):
+                recheck, self.recheck_messages = self.recheck_messages, False
+                # Вернувшаяся проверка ещё не читала сообщения - она и увидит новые
+                if recheck and not deferred:
+                    self.enqueue_wake_check()
+            if deferred:
+                self.action_queue.extend(batch)
+            # Освободилось место - отложенный фон снова в очередь
+            self.action_queue.extend(self.deferred_background)
+            self.deferred_background.clear()
+            self.in_flight.pop(future, None)
+        actions = ', '.join(decision['action'] for decision in batch)
+        if deferred:
+            logging.info(f"{actions} возвращено в очередь: {str(error)}")
+        elif error is not None:
+            logging.error(f"Ошибка действия {actions}: {str(error)}")
+            for decision in batch:
+                self.release_action(decision)
+        self.wakeup.set()
+    
+    def daemon_tick(self):
+        """Один шаг резидентного цикла: решение + выполнение очереди"""
+        self.refresh_memory_index()
+        self.rotate_logs()
+        
+        # Решения читают и переносят дедлайны проактивности, которые воркеры и
+        # управляющий сокет меняют из своих потоков
+        with self.state_lock:
+            if not self.action_queue:
+                decision = self.decide_action()
+                is_background = decision['action'] not in (
+                    'check_messages', 'proactive_message', 'proactive_care'
+                )
+            
+                # Фоновые задачи не чаще чем раз в BACKGROUND_PACE
+                if is_background and self.clock.time() < self.next_background_at:
+                    return
+                if is_background:
+                    self.next_background_at = self.clock.time() + BACKGROUND_PACE
+            
+                # Размышление идёт в своём потоке и не занимает очередь
+                if decision['action'] == 'deep_thinking':
+                    self.job_runner.submit()
+                # Фоновой работы нет - Claude свободен для сообщений
+                elif decision['action'] != 'idle':
+                    self.action_queue.append(decision)
+            
+                # К проверке сообщений подцепляем лёгкую фоновую задачу
+                if decision['action'] == 'check_messages' and self.clock.time() >= self.next_background_at:
+                    background = self.get_background_task()
+                    if self.batcher.is_cheap(background):
+                        self.next_background_at = self.clock.time() + BACKGROUND_PACE
+                        self.action_queue.append(background)
+        
+            # Остальные, кому пора написать, - пачками на свободных воркерах
+            capacity = self.claude_pool.size * self.batcher.max_batch
+            while len(self.action_queue) < capacity:
+                extra = self.check_proactive_needs()
+                if not extra:
+                    break
+                self.action_queue.append(extra)
+        
+
+        self.drain_action_queue()
+    
+    def stop(self, *_):
+        """Мягкая остановка резидентного режима"""
+        logging.info("Получен сигнал остановки")
+        self.running = False
+        self.wakeup.set()
+    
+    def write_pid(self):
+        """Записывает PID резидентного процесса"""
+        with open(self.pid_file, 'w') as f:
+            f.write(str(os.getpid()))
+    
+    def run_daemon(self):
+        """Резидентный режим: состояние в памяти, решения по своим таймерам"""
+        logging.info("=== Life Orchestrator запущен в режиме демона ===")
+        self.running = True
+        self.write_pid()
+        self.persistent_queue.purge()
+        self.claude_pool.start()
+        self.job_runner.start()
+        # Потоков вдвое больше воркеров: фон занимает не больше половины
+        self.action_executor = ThreadPoolExecutor(max_workers=self.claude_pool.size * 2)
+        self.control_server = ControlServer()
+        self.control_server.register('PING', self.handle_ping)
+        self.control_server.register('WAKE', self.handle_wake)
+        self.control_server.register('SEEN', self.handle_seen)
+        self.control_server.start()
+        if os.environ.get('METRICS_PORT'):
+            serve_metrics(int(os.environ['METRICS_PORT']), self.metrics_totals)
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        
+        try:
+            while self.running:
+                self.daemon_tick()
+                
+                delay = self.seconds_until_next_decision()
+                self.wakeup.wait(delay)
+                self.wakeup.clear()
+        finally:
+            self.control_server.stop()
+            self.job_runner.stop()
+            self.action_executor.shutdown(wait=True)
+            self.claude_pool.shutdown()
+            self.save_state()
+            self.pid_file.unlink(missing_ok=True)
+            logging.info("=== Life Orchestrator остановлен ===")
+
+
+def daemon_is_running(pid_file=Path("state/orchestrator.pid")):
+    """Проверяет, жив ли резидентный оркестратор"""
+    try:
+        pid = int(pid_file.read_text().strip())
+        os.kill(pid, 0)
+        return True
+    except (OSError, ValueError):
+        return False
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Life Orchestrator")
+    parser.add_argument('--daemon', action='store_true',
+                        help="резидентный режим вместо одного цикла")
+    parser.add_argument('--seen', metavar='USER_ID',
+                        help="отметить активность пользователя и выйти")
+    args = parser.parse_args()
+    
+    # Если демон жив - активность передаём ему, чтобы не расходилось состояние
+    if args.seen and send_command('SEEN', args.seen):
+        sys.exit(0)
+    
     orchestrator = LifeOrchestrator()
-    orchestrator.run()
\ No newline at end of file
+    if args.seen:
+        orchestrator.record_user_activity(args.seen)
+    elif args.daemon:
+        if daemon_is_running(orchestrator.pid_file):
+            logging.info("Демон уже запущен, выходим")
+        else:
+            orchestrator.run_daemon()
+    else:
+        orchestrator.run()
\ No newline at end of file
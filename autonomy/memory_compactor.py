@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+🧹 Memory Compactor - детерминированное сжатие памяти без вызова Claude
+
+Для каждого Memory/people/{user_id}/:
+1. удаляет дубликаты разговоров и повторяющиеся абзацы заметок (по хешу);
+2. сворачивает старые разговоры в conversations/archive/YYYY-MM.md;
+3. держит размер памяти в пределах лимита, сжимая старые архивы в .gz;
+4. пишет INDEX.md - оглавление памяти пользователя.
+"""
+
+import argparse
+import gzip
+import hashlib
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from state_store import MEMORY_DIR
+
+# Разговоры старше стольких дней уходят в месячный архив
+ARCHIVE_AFTER_DAYS = 14
+# Лимит памяти одного пользователя (байты, без учёта сжатых архивов)
+USER_SIZE_CAP = 512 * 1024
+# Абзацы короче не считаем заметками (разделители, короткие пометки)
+MIN_PARAGRAPH_CHARS = 40
+NOTE_SUFFIXES = {'.md', '.txt'}
+INDEX_NAME = 'INDEX.md'
+
+DATE_IN_NAME = re.compile(r'(\d{4})-(\d{2})-(\d{2})')
+
+
+def _digest(text):
+    return hashlib.sha256(' '.join(text.split()).encode('utf-8')).hexdigest()
+
+
+def _write_atomic(path, text):
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.write_text(text)
+    os.replace(tmp_path, path)
+
+
+class MemoryCompactor:
+    def __init__(self, root=MEMORY_DIR, archive_after_days=ARCHIVE_AFTER_DAYS,
+                 user_size_cap=USER_SIZE_CAP):
+        self.people = Path(root) / 'people'
+        self.archive_after = timedelta(days=archive_after_days)
+        self.user_size_cap = user_size_cap
+
+    def compact(self, now=None):
+        """Сжимает память всех пользователей, возвращает общую статистику"""
+        now = now or datetime.now()
+        totals = {'duplicates': 0, 'paragraphs': 0, 'archived': 0, 'gzipped': 0, 'users': 0}
+        if not self.people.exists():
+            return totals
+
+        for user_dir in sorted(p for p in self.people.iterdir() if p.is_dir()):
+            stats = self.compact_user(user_dir, now)
+            totals['users'] += 1
+            for key, value in stats.items():
+                totals[key] = totals.get(key, 0) + value
+
+        logging.info(f"Сжатие памяти: {totals}")
+        return totals
+
+    def compact_user(self, user_dir, now):
+        conversations = user_dir / 'conversations'
+        archive = conversations / 'archive'
+        stats = {
+            'duplicates': self.dedupe_conversations(conversations),
+            'paragraphs': self.dedupe_notes(user_dir),
+            'archived': self.roll_up(conversations, archive, now),
+        }
+        stats['gzipped'] = self.enforce_cap(user_dir, archive)
+        self.write_index(user_dir)
+        return stats
+
+    def conversation_date(self, path):
+        """Дата разговора: из имени файла, иначе по mtime"""
+        match = DATE_IN_NAME.search(path.name)
+        if match:
+            try:
+                return datetime(*map(int, match.groups()))
+            except ValueError:
+                pass
+        return datetime.fromtimestamp(path.stat().st_mtime)
+
+    def _conversation_files(self, conversations):
+        if not conversations.is_dir():
+            return []
+        return sorted(
+            p for p in conversations.iterdir()
+            if p.is_file() and p.suffix in NOTE_SUFFIXES
+        )
+
+    def dedupe_conversations(self, conversations):
+        """Одинаковые разговоры: оставляем самый ранний файл"""
+        files = sorted(self._conversation_files(conversations),
+                       key=lambda p: (self.conversation_date(p), p.name))
+        seen = set()
+        removed = 0
+        for path in files:
+            digest = _digest(path.read_text(errors='replace'))
+            if digest in seen:
+                path.unlink()
+                removed += 1
+            else:
+                seen.add(digest)
+        return removed
+
+    def dedupe_notes(self, user_dir):
+        """Повторяющиеся абзацы в заметках (profile.md, patterns.md, ...)"""
+        removed = 0
+        for path in sorted(user_dir.iterdir()):
+            if not path.is_file() or path.suffix not in NOTE_SUFFIXES or path.name == INDEX_NAME:
+                continue
+            text = path.read_text(errors='replace')
+            paragraphs = re.split(r'\n\s*\n', text)
+            seen = set()
+            kept = []
+            for paragraph in paragraphs:
+                stripped = paragraph.strip()
+                # Заголовки и короткие пометки не трогаем - они структурируют файл
+                if len(stripped) >= MIN_PARAGRAPH_CHARS and not stripped.startswith('#'):
+                    digest = _digest(stripped)
+                    if digest in seen:
+                        removed += 1
+                        continue
+                    seen.add(digest)
+                kept.append(paragraph)
+            if len(kept) != len(paragraphs):
+                _write_atomic(path, '\n\n'.join(kept))
+        return removed
+
+    def roll_up(self, conversations, archive, now):
+        """Старые разговоры дописываются в архив своего месяца"""
+        cutoff = now - self.archive_after
+        by_month = {}
+        for path in self._conversation_files(conversations):
+            date = self.conversation_date(path)
+            if date < cutoff:
+                by_month.setdefault(date.strftime('%Y-%m'), []).append((date, path))
+        if not by_month:
+            return 0
+
+        archive.mkdir(exist_ok=True)
+        archived = 0
+        for month, items in sorted(by_month.items()):
+            sections = []
+            for date, path in sorted(items, key=lambda item: (item[0], item[1].name)):
+                sections.append(f"## {path.stem}\n\n{path.read_text(errors='replace').strip()}\n\n")
+            block = ''.join(sections)
+
+            plain = archive / f"{month}.md"
+            packed = archive / f"{month}.md.gz"
+            if packed.exists():
+                # Месяц уже сжат - дописываем ещё один gzip-фрагмент
+                with gzip.open(packed, 'at') as f:
+                    f.write(block)
+            else:
+                existing = plain.read_text() if plain.exists() else f"# Разговоры {month}\n\n"
+                _write_atomic(plain, existing + block)
+
+            for _, path in items:
+                path.unlink()
+                archived += 1
+        return archived
+
+    def user_size(self, user_dir):
+        """Размер несжатой памяти пользователя"""
+        return sum(
+            p.stat().st_size for p in user_dir.rglob('*')
+            if p.is_file() and p.suffix in NOTE_SUFFIXES
+        )
+
+    def enforce_cap(self, user_dir, archive):
+        """Сверх лимита сжимаем архивы, начиная со старых (ничего не удаляем)"""
+        size = self.user_size(user_dir)
+        if size <= self.user_size_cap or not archive.is_dir():
+            return 0
+
+        gzipped = 0
+        for plain in sorted(archive.glob('*.md')):
+            if size <= self.user_size_cap:
+                break
+            packed = plain.with_name(plain.name + '.gz')
+            plain_size = plain.stat().st_size
+            with gzip.open(packed, 'ab') as f:
+                f.write(plain.read_bytes())
+            plain.unlink()
+            size -= plain_size
+            gzipped += 1
+
+        if size > self.user_size_cap:
+            logging.warning(f"Память {user_dir.name} больше лимита даже после сжатия архивов: {size} байт")
+        return gzipped
+
+    def write_index(self, user_dir):
+        """INDEX.md: что есть в памяти пользователя"""
+        lines = [f"# Память {user_dir.name}", "", "## Заметки"]
+        for path in sorted(user_dir.iterdir()):
+            if path.is_file() and path.suffix in NOTE_SUFFIXES and path.name != INDEX_NAME:
+                lines.append(f"- {path.name} ({path.stat().st_size} байт)")
+
+        conversations = user_dir / 'conversations'
+        recent = self._conversation_files(conversations)
+        lines += ["", f"## Разговоры: {len(recent)}"]
+        for path in recent[-10:]:
+            lines.append(f"- conversations/{path.name}")
+
+        archive = conversations / 'archive'
+        if archive.is_dir():
+            lines += ["", "## Архив"]
+            for path in sorted(archive.iterdir()):
+                note = " (сжат)" if path.suffix == '.gz' else ""
+                lines.append(f"- conversations/archive/{path.name}{note}")
+
+        text = "\n".join(lines) + "\n"
+        index_path = user_dir / INDEX_NAME
+        # Не трогаем файл без изменений, чтобы индекс памяти не переиндексировал его
+        if not index_path.exists() or index_path.read_text() != text:
+            _write_atomic(index_path, text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сжатие памяти Клэр")
+    parser.add_argument('--root', default=str(MEMORY_DIR), help="папка памяти")
+    args = parser.parse_args()
+    print(MemoryCompactor(Path(args.root)).compact())
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+🗂️ Memory Index - инкрементальный индекс памяти Клэр (SQLite + FTS5)
+
+Отслеживает файлы Memory/people/{user_id}/ и Memory/evolution/ по mtime и хешу
+и переиндексирует только изменившееся.
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from state_store import MEMORY_DIR, STATE_DIR
+
+# Какие файлы считаем памятью
+INDEXED_SUFFIXES = {'.md', '.txt'}
+
+
+class MemoryIndex:
+    def __init__(self, root=MEMORY_DIR, db_path=STATE_DIR / "memory_index.db"):
+        self.root = Path(root)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.fts = self._init_schema()
+
+    def _init_schema(self):
+        """Создаёт таблицы; возвращает True, если доступен FTS5"""
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                user_id TEXT,
+                kind TEXT,
+                mtime_ns INTEGER,
+                size INTEGER,
+                sha256 TEXT,
+                content TEXT
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_user ON files(user_id, kind)")
+
+        try:
+            self.conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS memory_fts
+                USING fts5(path UNINDEXED, user_id UNINDEXED, content)
+            """)
+            fts = True
+        except sqlite3.OperationalError:
+            # SQLite без FTS5 - ищем через LIKE
+            logging.warning("FTS5 недоступен, поиск по памяти будет медленнее")
+            fts = False
+
+        self.conn.commit()
+        return fts
+
+    def classify(self, rel_path):
+        """Определяет владельца и вид файла по пути внутри Memory/"""
+        parts = rel_path.parts
+        if len(parts) >= 3 and parts[0] == 'people':
+            user_id = parts[1]
+            kind = 'conversation' if parts[2] == 'conversations' else Path(parts[2]).stem
+            return user_id, kind
+        if len(parts) >= 2 and parts[0] == 'evolution':
+            return None, f"evolution:{parts[1] if len(parts) > 2 else Path(parts[1]).stem}"
+        return None, 'other'
+
+    def _walk(self):
+        """Перечисляет файлы памяти (только stat, без чтения)"""
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = Path(dirpath) / name
+                if path.suffix in INDEXED_SUFFIXES:
+                    yield path
+
+    def refresh(self):
+        """Переиндексирует изменившиеся файлы, возвращает статистику"""
+        stats = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+
+        with self.lock:
+            known = {
+                row['path']: row
+                for row in self.conn.execute("SELECT path, mtime_ns, size, sha256 FROM files")
+            }
+            seen = set()
+
+            for path in self._walk():
+                key = str(path.relative_to(self.root))
+                seen.add(key)
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+
+                row = known.get(key)
+                if row and row['mtime_ns'] == st.st_mtime_ns and row['size'] == st.st_size:
+                    stats['unchanged'] += 1
+                    continue
+
+                data = path.read_bytes()
+                digest = hashlib.sha256(data).hexdigest()
+
+                if row and row['sha256'] == digest:
+                    # Файл тронули, но содержимое то же - обновляем только mtime
+                    self.conn.execute(
+                        "UPDATE files SET mtime_ns = ?, size = ? WHERE path = ?",
+                        (st.st_mtime_ns, st.st_size, key)
+                    )
+                    stats['unchanged'] += 1
+                    continue
+
+                content = data.decode('utf-8', errors='replace')
+                user_id, kind = self.classify(Path(key))
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, user_id, kind, st.st_mtime_ns, st.st_size, digest, content)
+                )
+                if self.fts:
+                    self.conn.execute("DELETE FROM memory_fts WHERE path = ?", (key,))
+                    self.conn.execute(
+                        "INSERT INTO memory_fts (path, user_id, content) VALUES (?, ?, ?)",
+                        (key, user_id, content)
+                    )
+                stats['updated' if row else 'added'] += 1
+
+            for key in set(known) - seen:
+                self.conn.execute("DELETE FROM files WHERE path = ?", (key,))
+                if self.fts:
+                    self.conn.execute("DELETE FROM memory_fts WHERE path = ?", (key,))
+                stats['removed'] += 1
+
+            self.conn.commit()
+
+        changed = stats['added'] + stats['updated'] + stats['removed']
+        if changed:
+            logging.info(f"Индекс памяти обновлён: {stats}")
+        return stats
+
+    def search(self, query, user_id=None, limit=20):
+        """Полнотекстовый поиск по памяти"""
+        with self.lock:
+            if self.fts:
+                # Каждое слово в кавычках - чтобы спецсимволы не ломали синтаксис FTS
+                match = ' '.join('"' + word.replace('"', '""') + '"' for word in query.split())
+                if not match:
+                    return []
+                sql = """
+                    SELECT path, user_id, snippet(memory_fts, 2, '[', ']', '…', 12) AS snippet
+                    FROM memory_fts WHERE memory_fts MATCH ?
+                """
+                args = [match]
+                if user_id is not None:
+                    sql += " AND user_id = ?"
+                    args.append(str(user_id))
+                sql += " ORDER BY bm25(memory_fts) LIMIT ?"
+            else:
+                sql = "SELECT path, user_id, substr(content, 1, 120) AS snippet FROM files WHERE content LIKE ?"
+                args = [f"%{query}%"]
+                if user_id is not None:
+                    sql += " AND user_id = ?"
+                    args.append(str(user_id))
+                sql += " LIMIT ?"
+            args.append(limit)
+            return [dict(row) for row in self.conn.execute(sql, args)]
+
+    def user_files(self, user_id, kind=None):
+        """Файлы пользователя (без содержимого), новые первыми"""
+        sql = "SELECT path, kind, mtime_ns, size, sha256 FROM files WHERE user_id = ?"
+        args = [str(user_id)]
+        if kind is not None:
+            sql += " AND kind = ?"
+            args.append(kind)
+        sql += " ORDER BY mtime_ns DESC"
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(sql, args)]
+
+    def user_ids(self):
+        """Все пользователи, о которых есть память"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT user_id FROM files WHERE user_id IS NOT NULL ORDER BY user_id"
+            )
+            return [row['user_id'] for row in rows]
+
+    def fingerprint(self, kinds=None):
+        """Хеш содержимого памяти о людях (по видам файлов) - меняется вместе с ней"""
+        sql = "SELECT path, sha256 FROM files WHERE user_id IS NOT NULL"
+        args = []
+        if kinds:
+            sql += f" AND kind IN ({', '.join('?' * len(kinds))})"
+            args.extend(kinds)
+        sql += " ORDER BY path"
+        digest = hashlib.sha256()
+        with self.lock:
+            for row in self.conn.execute(sql, args):
+                digest.update(f"{row['path']}\0{row['sha256']}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    def read(self, path):
+        """Содержимое файла из индекса (без обращения к диску)"""
+        with self.lock:
+            row = self.conn.execute("SELECT content FROM files WHERE path = ?", (str(path),)).fetchone()
+        return row['content'] if row else None
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Индекс памяти Клэр")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('refresh', help="обновить индекс")
+    search_parser = sub.add_parser('search', help="полнотекстовый поиск")
+    search_parser.add_argument('query')
+    search_parser.add_argument('--user')
+    search_parser.add_argument('--limit', type=int, default=20)
+    user_parser = sub.add_parser('user', help="файлы пользователя")
+    user_parser.add_argument('user_id')
+    args = parser.parse_args()
+
+    index = MemoryIndex()
+    stats = index.refresh()
+    if args.command == 'refresh':
+        print(stats)
+    elif args.command == 'search':
+        for hit in index.search(args.query, user_id=args.user, limit=args.limit):
+            print(f"{hit['path']}: {hit['snippet']}")
+    elif args.command == 'user':
+        for row in index.user_files(args.user_id):
+            print(f"{row['kind']:14} {row['path']}")
+    index.close()
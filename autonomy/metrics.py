@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+📊 Metrics - счётчики и гистограммы оркестратора в формате Prometheus
+
+Пишется в state/metrics.prom (для textfile-коллектора node_exporter),
+в резидентном режиме можно отдавать и по HTTP (METRICS_PORT).
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from state_store import STATE_DIR
+
+DEFAULT_METRICS_FILE = STATE_DIR / 'metrics.prom'
+# Границы гистограмм (секунды): от быстрых проверок до долгих размышлений
+DEFAULT_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _labels_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + list(extra or [])
+    if not pairs:
+        return ''
+    body = ','.join(f'{k}="{str(v)}"' for k, v in pairs)
+    return '{' + body + '}'
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> {'buckets', 'counts', 'sum', 'count'}
+        self.help = {}
+
+    def inc(self, name, labels=None, value=1, help=None):
+        """Увеличивает счётчик"""
+        key = (name, _labels_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.help.setdefault(name, ('counter', help or name))
+
+    def observe(self, name, seconds, labels=None, buckets=DEFAULT_BUCKETS, help=None):
+        """Добавляет наблюдение в гистограмму"""
+        key = (name, _labels_key(labels))
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = {'buckets': list(buckets), 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+                self.histograms[key] = hist
+            for i, bound in enumerate(hist['buckets']):
+                if seconds <= bound:
+                    hist['counts'][i] += 1
+            hist['sum'] += seconds
+            hist['count'] += 1
+            self.help.setdefault(name, ('histogram', help or name))
+
+    @contextmanager
+    def timer(self, name, labels=None, help=None):
+        """Замеряет длительность блока в гистограмму"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - started, labels, help=help)
+
+    def render(self):
+        """Текстовый формат экспозиции Prometheus"""
+        lines = []
+        with self.lock:
+            names = sorted({name for name, _ in self.counters} | {name for name, _ in self.histograms})
+            for name in names:
+                kind, help_text = self.help.get(name, ('untyped', name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for (metric, labels), value in sorted(self.counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+                for (metric, labels), hist in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(hist['buckets'], hist['counts']):
+                        lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist['count']}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {round(hist['sum'], 6)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Состояние для сохранения между запусками из cron"""
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), hist] for (name, labels), hist in self.histograms.items()],
+                'help': self.help,
+            }
+
+    def drain(self):
+        """Забирает накопленное (дельту) и обнуляет реестр"""
+        snapshot = self.snapshot()
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        """Прибавляет снимок к текущим значениям"""
+        if not snapshot:
+            return
+        with self.lock:
+            for name, labels, value in snapshot.get('counters', []):
+                key = (name, tuple(tuple(pair) for pair in labels))
+                self.counters[key] = self.counters.get(key, 0) + value
+            for name, labels, other in snapshot.get('histograms', []):
+                key = (name, tuple(tuple(pair) for pair in labels))
+                hist = self.histograms.get(key)
+                if hist is None or hist['buckets'] != other['buckets']:
+                    self.histograms[key] = {
+                        'buckets': list(other['buckets']), 'counts': list(other['counts']),
+                        'sum': other['sum'], 'count': other['count']
+                    }
+                    continue
+                hist['counts'] = [a + b for a, b in zip(hist['counts'], other['counts'])]
+                hist['sum'] += other['sum']
+                hist['count'] += other['count']
+            for name, (kind, help_text) in snapshot.get('help', {}).items():
+                self.help.setdefault(name, (kind, help_text))
+
+    def replace(self, snapshot):
+        """Заменяет содержимое реестра снимком"""
+        fresh = MetricsRegistry()
+        fresh.merge(snapshot)
+        with self.lock:
+            self.counters = fresh.counters
+            self.histograms = fresh.histograms
+            self.help = fresh.help
+
+    def write(self, path=DEFAULT_METRICS_FILE):
+        """Атомарно пишет файл метрик"""
+        path = str(path)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+# Общий реестр процесса
+REGISTRY = MetricsRegistry()
+
+
+def export(store, registry=REGISTRY, path=DEFAULT_METRICS_FILE):
+    """Сливает дельту процесса в общие итоги (metrics.snapshot) и пишет файл метрик
+
+    Вызывает каждый процесс, который что-то считал, - иначе счётчики пропадут
+    вместе с ним. Возвращает итоги или None, если сливать нечего.
+    """
+    delta = registry.drain()
+    if not delta['counters'] and not delta['histograms']:
+        return None
+    try:
+        with store.transaction():
+            totals = MetricsRegistry()
+            totals.merge(store.get('metrics.snapshot'))
+            totals.merge(delta)
+            store.set('metrics.snapshot', totals.snapshot())
+        totals.write(path)
+    except Exception as e:
+        logging.error(f"Ошибка записи метрик: {str(e)}")
+        return None
+    return totals
+
+
+def serve(port, registry=REGISTRY):
+    """Отдаёт /metrics по HTTP в фоновом потоке"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Метрики доступны на http://127.0.0.1:{port}/metrics")
+    return server
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+⏰ Proactive Scheduler - очередь дедлайнов проактивности по пользователям
+"""
+
+import heapq
+import itertools
+
+
+class ProactiveScheduler:
+    """Min-heap дедлайнов: на каждом тике достаём только тех, кому пора"""
+
+    def __init__(self):
+        self.heap = []  # (due_ts, seq, user_id)
+        self.deadlines = {}  # user_id -> актуальный due_ts
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def __contains__(self, user_id):
+        return user_id in self.deadlines
+
+    def schedule(self, user_id, due_ts):
+        """Назначает (или переносит) дедлайн пользователя"""
+        self.deadlines[user_id] = due_ts
+        heapq.heappush(self.heap, (due_ts, next(self.counter), user_id))
+        self._compact_if_needed()
+
+    def cancel(self, user_id):
+        """Снимает пользователя с расписания"""
+        self.deadlines.pop(user_id, None)
+
+    def due_time(self, user_id):
+        """Текущий дедлайн пользователя или None"""
+        return self.deadlines.get(user_id)
+
+    def next_due(self):
+        """Ближайший дедлайн среди всех пользователей"""
+        self._drop_stale()
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now_ts, limit=None):
+        """Достаёт пользователей с наступившим дедлайном (по порядку)"""
+        due = []
+        while self.heap and (limit is None or len(due) < limit):
+            self._drop_stale()
+            if not self.heap or self.heap[0][0] > now_ts:
+                break
+            _, _, user_id = heapq.heappop(self.heap)
+            del self.deadlines[user_id]
+            due.append(user_id)
+        return due
+
+    def _drop_stale(self):
+        """Убирает с вершины записи, которые уже перенесены или отменены"""
+        while self.heap:
+            due_ts, _, user_id = self.heap[0]
+            if self.deadlines.get(user_id) == due_ts:
+                return
+            heapq.heappop(self.heap)
+
+    def _compact_if_needed(self):
+        """Перестраивает кучу, если устаревших записей стало слишком много"""
+        if len(self.heap) > 2 * len(self.deadlines) + 64:
+            self.heap = [
+                entry for entry in self.heap
+                if self.deadlines.get(entry[2]) == entry[0]
+            ]
+            heapq.heapify(self.heap)
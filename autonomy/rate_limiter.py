@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+🚦 Rate Limiter - общий лимит вызовов Claude CLI для всех процессов
+
+Оркестратор, health monitor, watchdog, life_daemon.sh и `life` запускают
+claude независимо друг от друга. Лимитер живёт в той же SQLite базе, что и
+StateStore, и ограничивает каждый класс вызовов двумя вещами: token bucket
+(вызовов в минуту с запасом на всплеск) и числом одновременных вызовов.
+Поверх классов действует общий предел одновременных вызовов.
+
+Для shell-скриптов:
+
+    python3 autonomy/rate_limiter.py run --class background --timeout 60 -- claude --no-markdown ".life"
+    python3 autonomy/rate_limiter.py status
+"""
+
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+from metrics import REGISTRY as metrics, export as export_metrics
+from state_store import StateStore
+
+# Бюджеты классов: вызовов в минуту, всплеск, одновременно, сколько ждать места (с)
+BUDGETS = {
+    'user':        {'per_minute': 12,  'burst': 4, 'concurrency': 3, 'wait': 30},
+    'care':        {'per_minute': 6,   'burst': 3, 'concurrency': 2, 'wait': 15},
+    'background':  {'per_minute': 3,   'burst': 2, 'concurrency': 2, 'wait': 5},
+    'maintenance': {'per_minute': 2,   'burst': 1, 'concurrency': 1, 'wait': 5},
+    'health':      {'per_minute': 2,   'burst': 1, 'concurrency': 1, 'wait': 0},
+    'restart':     {'per_minute': 0.2, 'burst': 1, 'concurrency': 1, 'wait': 0},
+    'standby':     {'per_minute': 1,   'burst': 2, 'concurrency': 1, 'wait': 0},
+}
+# Сколько вызовов claude одновременно на всю систему
+MAX_CONCURRENCY = int(os.environ.get('CLAUDE_MAX_CONCURRENCY', 3))
+# Место, не освобождённое дольше этого, считается брошенным (секунды)
+DEFAULT_HOLD = 300
+# Код выхода CLI, если место не досталось (EX_TEMPFAIL)
+EXIT_LIMITED = 75
+
+
+class RateLimited(Exception):
+    """Лимит вызовов исчерпан - вызов стоит отложить, а не считать сбоем"""
+
+
+def _alive(host, pid):
+    """Жив ли владелец места (о чужих хостах судим только по сроку)"""
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+
+
+class RateLimiter:
+    def __init__(self, store=None, budgets=None, max_concurrency=None):
+        self.store = store or StateStore()
+        self.budgets = budgets or BUDGETS
+        self.max_concurrency = max_concurrency or MAX_CONCURRENCY
+        self.host = socket.gethostname()
+        with self.store.lock:
+            self.store.conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_buckets (
+                    class TEXT PRIMARY KEY,
+                    tokens REAL,
+                    updated_at REAL
+                )
+            """)
+            self.store.conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_slots (
+                    id TEXT PRIMARY KEY,
+                    class TEXT,
+                    host TEXT,
+                    pid INTEGER,
+                    acquired_at REAL,
+                    expires_at REAL
+                )
+            """)
+
+    def budget(self, klass):
+        if klass not in self.budgets:
+            raise ValueError(f"Неизвестный класс вызовов: {klass}")
+        return self.budgets[klass]
+
+    def _drop_stale_slots(self, now):
+        """Места упавших процессов и просроченные - освобождаем (в транзакции)"""
+        conn = self.store.conn
+        for slot_id, host, pid, expires_at in conn.execute(
+            "SELECT id, host, pid, expires_at FROM rate_slots"
+        ).fetchall():
+            if expires_at < now or not _alive(host, pid):
+                conn.execute("DELETE FROM rate_slots WHERE id = ?", (slot_id,))
+
+    def try_acquire(self, klass, hold=DEFAULT_HOLD, pid=None):
+        """Берёт место без ожидания; возвращает id места или None"""
+        budget = self.budget(klass)
+        now = time.time()
+        conn = self.store.conn
+        with self.store.transaction():
+            self._drop_stale_slots(now)
+
+            running = conn.execute("SELECT COUNT(*) FROM rate_slots").fetchone()[0]
+            running_class = conn.execute(
+                "SELECT COUNT(*) FROM rate_slots WHERE class = ?", (klass,)
+            ).fetchone()[0]
+            if running >= self.max_concurrency or running_class >= budget['concurrency']:
+                return None
+
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM rate_buckets WHERE class = ?", (klass,)
+            ).fetchone()
+            tokens = budget['burst'] if row is None else min(
+                budget['burst'], row[0] + (now - row[1]) * budget['per_minute'] / 60
+            )
+            if tokens < 1:
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_buckets VALUES (?, ?, ?)", (klass, tokens, now)
+                )
+                return None
+
+            slot_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets VALUES (?, ?, ?)", (klass, tokens - 1, now)
+            )
+            conn.execute(
+                "INSERT INTO rate_slots VALUES (?, ?, ?, ?, ?, ?)",
+                (slot_id, klass, self.host, pid or os.getpid(), now, now + hold)
+            )
+        return slot_id
+
+    def acquire(self, klass, hold=DEFAULT_HOLD, wait=None, pid=None):
+        """Ждёт место не дольше wait секунд (по умолчанию - бюджет класса)"""
+        wait = self.budget(klass)['wait'] if wait is None else wait
+        deadline = time.monotonic() + wait
+        delay = 0.2
+        while True:
+            slot_id = self.try_acquire(klass, hold, pid)
+            if slot_id:
+                return slot_id
+            if time.monotonic() >= deadline:
+                metrics.inc('life_claude_rate_limited_total', {'class': klass},
+                            help="Вызовы Claude, не получившие места в лимите")
+                raise RateLimited(f"Лимит вызовов Claude для класса {klass} исчерпан")
+            time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+            delay = min(delay * 2, 2.0)
+
+    def release(self, slot_id):
+        with self.store.lock:
+            self.store.conn.execute("DELETE FROM rate_slots WHERE id = ?", (slot_id,))
+
+    @contextmanager
+    def slot(self, klass, hold=DEFAULT_HOLD, wait=None):
+        """Место на время блока; RateLimited - если не досталось"""
+        slot_id = self.acquire(klass, hold, wait)
+        try:
+            yield slot_id
+        finally:
+            self.release(slot_id)
+
+    def status(self):
+        """Текущие места и запас токенов по классам"""
+        now = time.time()
+        with self.store.transaction():
+            self._drop_stale_slots(now)
+            slots = self.store.conn.execute(
+                "SELECT class, COUNT(*) FROM rate_slots GROUP BY class"
+            ).fetchall()
+            buckets = self.store.conn.execute(
+                "SELECT class, tokens, updated_at FROM rate_buckets"
+            ).fetchall()
+        running = dict(slots)
+        tokens = {klass: (value, updated_at) for klass, value, updated_at in buckets}
+        report = {}
+        for klass, budget in self.budgets.items():
+            value, updated_at = tokens.get(klass, (budget['burst'], now))
+            report[klass] = {
+                'running': running.get(klass, 0),
+                'concurrency': budget['concurrency'],
+                'tokens': round(min(budget['burst'], value + (now - updated_at) * budget['per_minute'] / 60), 2),
+                'per_minute': budget['per_minute'],
+            }
+        return report
+
+
+def run_limited(limiter, klass, command, timeout=None, wait=None):
+    """Запускает команду, держа место в лимите; возвращает код выхода"""
+    hold = (timeout or DEFAULT_HOLD) + 30
+    try:
+        slot_id = limiter.acquire(klass, hold, wait)
+    except RateLimited as e:
+        print(f"🚦 {e}", file=sys.stderr)
+        return EXIT_LIMITED
+    try:
+        proc = subprocess.Popen(command)
+        try:
+            return proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.send_signal(signal.SIGTERM)
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+            # Как у coreutils timeout
+            return 124
+        except KeyboardInterrupt:
+            proc.send_signal(signal.SIGINT)
+            return proc.wait()
+    finally:
+        limiter.release(slot_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Общий лимит вызовов Claude CLI")
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_parser = sub.add_parser('run', help="выполнить команду в пределах лимита")
+    run_parser.add_argument('--class', dest='klass', default='background', choices=sorted(BUDGETS))
+    run_parser.add_argument('--timeout', type=float, help="таймаут команды, с")
+    run_parser.add_argument('--wait', type=float, help="сколько ждать места, с")
+    run_parser.add_argument('argv', nargs=argparse.REMAINDER)
+    sub.add_parser('status', help="занятые места и запас по классам")
+    args = parser.parse_args()
+
+    limiter = RateLimiter()
+    if args.command == 'status':
+        for klass, info in limiter.status().items():
+            print(f"{klass:12} {info['running']}/{info['concurrency']} одновременно, "
+                  f"токенов {info['tokens']} (+{info['per_minute']}/мин)")
+        sys.exit(0)
+
+    argv = args.argv[1:] if args.argv[:1] == ['--'] else args.argv
+    if not argv:
+        parser.error("нужна команда после --")
+    code = run_limited(limiter, args.klass, argv, args.timeout, args.wait)
+    # Отказы лимита из скриптов - в общие метрики
+    export_metrics(limiter.store)
+    sys.exit(code)
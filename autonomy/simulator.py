@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+🧪 Simulator - сутки решений оркестратора за секунды на виртуальных часах
+
+Прогоняет поток входящих сообщений (синтетический или записанный) через
+настоящий LifeOrchestrator с виртуальными часами (clock.py) и заглушкой вместо
+Claude: вызов «длится» SIM_DURATIONS секунд виртуального времени. Каждая
+политика опроса и проактивности считается в своей папке с чистым состоянием
+и получает один и тот же поток сообщений.
+
+    python3 autonomy/simulator.py --days 1 --users 5
+    python3 autonomy/simulator.py --trace messages.jsonl --policies cron_fixed daemon_push
+
+Формат записанного потока - JSONL: {"ts": "2026-10-17T09:15:00", "user_id": "365991821"}
+
+Упрощения: действия выполняются по одному (один воркер), ночное размышление
+идёт параллельно, как в своём потоке демона.
+"""
+
+import argparse
+import importlib
+import json
+import math
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from pathlib import Path
+
+AUTONOMY_DIR = Path(__file__).resolve().parent
+
+# Политики: как запускается оркестратор, адаптивный опрос, сигнал от моста,
+# и константы life_orchestrator, которые политика переопределяет
+POLICIES = {
+    'cron_fixed': {'mode': 'cron', 'adaptive': False, 'push': False},
+    'daemon_fixed': {'mode': 'daemon', 'adaptive': False, 'push': False},
+    'daemon_adaptive': {'mode': 'daemon', 'adaptive': True, 'push': False},
+    'daemon_push': {'mode': 'daemon', 'adaptive': True, 'push': True},
+    'daemon_push_patient': {
+        'mode': 'daemon', 'adaptive': True, 'push': True,
+        'constants': {'PROACTIVE_MESSAGE_SILENCE': 180, 'PROACTIVE_COOLDOWN': 240},
+    },
+}
+# Интервал cron для life_daemon.sh (секунды)
+CRON_INTERVAL = 300
+# Сколько виртуальных секунд длится вызов Claude
+SIM_DURATIONS = {
+    'check_messages': 30,
+    'proactive_message': 20,
+    'proactive_care': 20,
+    'deep_thinking': 240,
+    'batch': 40,
+}
+DEFAULT_DURATION = 90
+# Сообщений в час на человека по часам суток (синтетический поток)
+HOURLY_RATE = [
+    0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.2,   # 0-7
+    0.6, 0.8, 0.6, 0.5, 0.8, 0.6, 0.4, 0.4,   # 8-15
+    0.5, 0.6, 0.9, 1.2, 1.4, 1.2, 0.8, 0.3,   # 16-23
+]
+
+
+def synthetic_trace(start, days, users, rate=1.0, seed=0):
+    """Пуассоновский поток сообщений по часовому профилю"""
+    rng = random.Random(seed)
+    events = []
+    for day in range(days):
+        for hour, hourly in enumerate(HOURLY_RATE):
+            for user in range(users):
+                count = _poisson(rng, hourly * rate)
+                for _ in range(count):
+                    when = start + timedelta(days=day, hours=hour, seconds=rng.uniform(0, 3600))
+                    events.append({'ts': when.isoformat(), 'user_id': str(100000 + user)})
+    events.sort(key=lambda event: event['ts'])
+    return events
+
+
+def _poisson(rng, mean):
+    """Число событий Пуассона (алгоритм Кнута, mean мал)"""
+    if mean <= 0:
+        return 0
+    limit, count, product = math.exp(-mean), 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def load_trace(path):
+    with open(path) as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    events.sort(key=lambda event: event['ts'])
+    return events
+
+
+def percentile(values, fraction):
+    """Перцентиль без интерполяции (values не пустой)"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Simulation:
+    """Одна политика на одном потоке сообщений (внутри рабочего процесса)"""
+
+    def __init__(self, policy, trace, start, end):
+        from clock import VirtualClock
+
+        self.policy = policy
+        self.clock = VirtualClock(start)
+        self.end = end
+        self.arrivals = deque((datetime.fromisoformat(e['ts']), str(e['user_id'])) for e in trace)
+        self.unanswered = deque()
+        self.module = importlib.import_module('life_orchestrator')
+        for name, value in policy.get('constants', {}).items():
+            setattr(self.module, name, value)
+
+        self.calls = Counter()
+        self.actions = Counter()
+        self.cli_seconds = 0.0
+        self.latencies = []
+        self.checks = 0
+        self.wasted_checks = 0
+        self.in_job = False
+        self.job_busy_until = 0.0
+
+    def make_orchestrator(self):
+        orchestrator = self.module.LifeOrchestrator(clock=self.clock)
+        orchestrator.run_claude_command = self.execute
+        if not self.policy['adaptive']:
+            orchestrator.activity.has_data = lambda: False
+        return orchestrator
+
+    def execute(self, command, action='unknown', decisions=(), on_chunk=None):
+        """Заглушка Claude: считает вызов и двигает виртуальное время"""
+        actions = [decision['action'] for decision in decisions] or [action]
+        duration = SIM_DURATIONS.get(action, DEFAULT_DURATION)
+        self.calls[action] += 1
+        self.actions.update(actions)
+        self.cli_seconds += duration
+
+        if 'check_messages' in actions:
+            self.answer(self.clock.now(), duration)
+
+        if self.in_job:
+            # Размышление идёт в своём потоке - основной цикл не ждёт
+            self.job_busy_until = self.clock.time() + duration
+        else:
+            self.clock.advance(duration)
+
+        output = "ok"
+        for index in re.findall(r'^=== TASK (\d+) ===', command, re.MULTILINE):
+            output += f"\n=== RESULT {index} ===\nok"
+        return output
+
+    def answer(self, started, duration):
+        """Проверка видит всё, что пришло до её начала"""
+        self.checks += 1
+        if not self.unanswered:
+            self.wasted_checks += 1
+            return
+        replied_at = started + timedelta(seconds=duration)
+        while self.unanswered and self.unanswered[0] <= started:
+            self.latencies.append((replied_at - self.unanswered.popleft()).total_seconds())
+
+    def deliver(self, orchestrator):
+        """Сообщения, пришедшие к текущему моменту: мост отмечает активность (и будит демон)"""
+        while self.arrivals and self.arrivals[0][0] <= self.clock.now():
+            when, user_id = self.arrivals.popleft()
+            self.unanswered.append(when)
+            if self.policy['push']:
+                orchestrator.handle_wake([user_id])
+            else:
+                orchestrator.record_user_activity(user_id, when)
+
+    def next_arrival(self):
+        return self.arrivals[0][0] if self.arrivals else self.end
+
+    def run_cron(self):
+        """Каждые CRON_INTERVAL - новый процесс оркестратора, один цикл"""
+        tick = self.clock.now()
+        while self.clock.now() < self.end:
+            self.clock.advance_to(tick)
+            orchestrator = self.make_orchestrator()
+            self.deliver(orchestrator)
+            orchestrator.run()
+            tick += timedelta(seconds=CRON_INTERVAL)
+            while tick < self.clock.now():
+                tick += timedelta(seconds=CRON_INTERVAL)
+
+    def run_daemon(self):
+        """Резидентный цикл: daemon_tick и сон до следующего решения"""
+        orchestrator = self.make_orchestrator()
+        orchestrator.running = True
+        orchestrator.drain_action_queue = lambda: self.drain(orchestrator)
+        orchestrator.job_runner.submit = lambda: self.run_job(orchestrator)
+
+        while self.clock.now() < self.end:
+            self.deliver(orchestrator)
+            orchestrator.daemon_tick()
+            wake_at = self.clock.now() + timedelta(seconds=orchestrator.seconds_until_next_decision())
+            if self.policy['push']:
+                wake_at = min(wake_at, self.next_arrival())
+            self.clock.advance_to(min(wake_at, self.end))
+
+    def drain(self, orchestrator):
+        """Очередь демона - синхронно, пачками, как на одном воркере"""
+        pending = []
+        while orchestrator.action_queue:
+            decision = orchestrator.action_queue.popleft()
+            if orchestrator.claim_action(decision):
+                pending.append(decision)
+        pending.sort(key=lambda decision: orchestrator.action_priority([decision]))
+        for batch in orchestrator.batcher.coalesce(pending):
+            orchestrator.execute_batch(batch)
+
+    def run_job(self, orchestrator):
+        """Один сегмент размышления, если поток задач свободен"""
+        if self.clock.time() < self.job_busy_until:
+            return
+        job = orchestrator.job_runner.active_job('deep_thinking')
+        if job:
+            self.in_job = True
+            try:
+                orchestrator.job_runner.run_segment(job)
+            finally:
+                self.in_job = False
+
+    def run(self):
+        started = time.perf_counter()
+        if self.policy['mode'] == 'cron':
+            self.run_cron()
+        else:
+            self.run_daemon()
+        answered = len(self.latencies)
+        return {
+            'invocations': sum(self.calls.values()),
+            'by_action': dict(self.actions),
+            'cli_minutes': round(self.cli_seconds / 60, 1),
+            'messages': answered + len(self.unanswered) + len(self.arrivals),
+            'answered': answered,
+            'reply_p50_min': round(percentile(self.latencies, 0.5) / 60, 1) if answered else None,
+            'reply_p95_min': round(percentile(self.latencies, 0.95) / 60, 1) if answered else None,
+            'reply_max_min': round(max(self.latencies) / 60, 1) if answered else None,
+            'checks': self.checks,
+            'wasted_checks': self.wasted_checks,
+            'proactive': self.actions['proactive_message'] + self.actions['proactive_care'],
+            'wall_s': round(time.perf_counter() - started, 2),
+        }
+
+
+def run_worker(args):
+    """Рабочий процесс: одна политика, состояние в текущей папке"""
+    sys.path.insert(0, str(AUTONOMY_DIR))
+    policy = POLICIES[args.worker]
+    start = datetime.fromisoformat(args.start)
+    simulation = Simulation(policy, load_trace(args.trace), start, start + timedelta(days=args.days))
+    print(json.dumps(simulation.run()))
+
+
+def run_policy(name, trace_path, start, days, root):
+    """Политика в своём процессе и своей папке: чистое состояние, свои логи"""
+    workdir = root / name
+    (workdir / 'Memory').mkdir(parents=True)
+    env = dict(
+        os.environ,
+        LIFE_STATE_DIR=str(workdir / 'state'),
+        LIFE_STATE_DB=str(workdir / 'state' / 'state.db'),
+        LIFE_LOG_DIR=str(workdir / 'logs'),
+    )
+    result = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), '--worker', name,
+         '--trace', str(trace_path), '--start', start.isoformat(), '--days', str(days)],
+        cwd=workdir, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Политика {name} упала:\n{result.stderr}")
+    return dict(json.loads(result.stdout.strip().splitlines()[-1]), policy=name)
+
+
+def print_report(results):
+    print(f"{'policy':20} {'calls':>6} {'cli min':>8} {'msgs':>5} {'p50 min':>8} {'p95 min':>8} "
+          f"{'max min':>8} {'checks':>7} {'wasted':>7} {'proact':>7} {'wall s':>7}")
+    for r in results:
+        print(f"{r['policy']:20} {r['invocations']:>6} {r['cli_minutes']:>8} {r['messages']:>5} "
+              f"{str(r['reply_p50_min']):>8} {str(r['reply_p95_min']):>8} {str(r['reply_max_min']):>8} "
+              f"{r['checks']:>7} {r['wasted_checks']:>7} {r['proactive']:>7} {r['wall_s']:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Симуляция расписания оркестратора на виртуальных часах")
+    parser.add_argument('--policies', nargs='+', choices=sorted(POLICIES), default=list(POLICIES))
+    parser.add_argument('--days', type=int, default=1, help="сколько суток моделировать")
+    parser.add_argument('--users', type=int, default=5, help="синтетических пользователей")
+    parser.add_argument('--rate', type=float, default=1.0, help="множитель частоты сообщений")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--trace', help="записанный поток сообщений (JSONL)")
+    parser.add_argument('--start', help="начало моделирования (ISO), по умолчанию - полночь потока")
+    parser.add_argument('--json', help="сохранить результаты в JSON")
+    parser.add_argument('--keep', action='store_true', help="не удалять рабочую папку")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        sys.exit(0)
+
+    root = Path(tempfile.mkdtemp(prefix='life_sim_'))
+    try:
+        if args.trace:
+            events = load_trace(args.trace)
+            first = datetime.fromisoformat(events[0]['ts']) if events else datetime.now()
+            start = datetime.fromisoformat(args.start) if args.start else datetime.combine(first.date(), datetime.min.time())
+        else:
+            start = datetime.fromisoformat(args.start) if args.start else datetime.combine(
+                datetime.now().date() - timedelta(days=args.days), datetime.min.time())
+            events = synthetic_trace(start, args.days, args.users, args.rate, args.seed)
+        trace_path = root / 'trace.jsonl'
+        trace_path.write_text(''.join(json.dumps(event) + '\n' for event in events))
+
+        results = [run_policy(name, trace_path, start, args.days, root) for name in args.policies]
+        print_report(results)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
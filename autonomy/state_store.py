@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+💾 State Store - общее транзакционное хранилище состояния (SQLite WAL)
+
+Одна база на все процессы автономности: оркестратор, watchdog, life_daemon.sh.
+Каждая запись - отдельный ключ, поэтому обновление стоит O(изменения),
+а не перезапись всего состояния.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+# Общий путь не зависит от текущей директории процесса
+STATE_DIR = Path(os.environ.get(
+    'LIFE_STATE_DIR',
+    Path(__file__).resolve().parent.parent / 'state'
+))
+DEFAULT_DB = Path(os.environ.get('LIFE_STATE_DB', STATE_DIR / 'state.db'))
+# Память Клэр - рядом с state/, тоже не от cwd
+MEMORY_DIR = Path(os.environ.get(
+    'LIFE_MEMORY_DIR',
+    Path(__file__).resolve().parent.parent / 'Memory'
+))
+
+
+class StateStore:
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path or DEFAULT_DB)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.RLock()
+        # isolation_level=None: сами управляем транзакциями через BEGIN
+        self.conn = sqlite3.connect(
+            str(self.db_path), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS map (
+                name TEXT, key TEXT, value TEXT,
+                PRIMARY KEY (name, key)
+            )
+        """)
+
+    @contextmanager
+    def transaction(self):
+        """Атомарный read-modify-write, безопасный между процессами"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            else:
+                self.conn.execute("COMMIT")
+
+    def get(self, key, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO kv VALUES (?, ?)",
+                (key, json.dumps(value, default=str))
+            )
+
+    def delete(self, key):
+        with self.lock:
+            self.conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def update(self, values):
+        """Записывает несколько ключей одной транзакцией"""
+        with self.transaction():
+            for key, value in values.items():
+                self.set(key, value)
+
+    def increment(self, key, delta=1):
+        """Атомарно увеличивает счётчик, возвращает новое значение"""
+        with self.transaction():
+            value = self.get(key, 0) + delta
+            self.set(key, value)
+        return value
+
+    def record_claude_outcome(self, ok):
+        """Исход реального вызова Claude - пульс, по которому судит health monitor"""
+        if ok:
+            self.update({'health.heartbeat': datetime.now().isoformat(), 'health.consecutive_failures': 0})
+        else:
+            self.increment('health.consecutive_failures')
+
+    def get_map(self, name):
+        """Весь словарь (например, users_silence_time)"""
+        with self.lock:
+            rows = self.conn.execute("SELECT key, value FROM map WHERE name = ?", (name,))
+            return {key: json.loads(value) for key, value in rows}
+
+    def get_map_item(self, name, key, default=None):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM map WHERE name = ? AND key = ?", (name, str(key))
+            ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_map_item(self, name, key, value):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO map VALUES (?, ?, ?)",
+                (name, str(key), json.dumps(value, default=str))
+            )
+
+    def delete_map_item(self, name, key):
+        with self.lock:
+            self.conn.execute("DELETE FROM map WHERE name = ? AND key = ?", (name, str(key)))
+
+    def is_empty(self):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM kv LIMIT 1").fetchone() is None
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    # Для shell-скриптов: python3 state_store.py set-now watchdog.last_success
+    # Исход вызова Claude: python3 state_store.py record-outcome <код выхода>
+    parser = argparse.ArgumentParser(description="Хранилище состояния")
+    parser.add_argument('command', choices=['get', 'set', 'set-now', 'record-outcome'])
+    parser.add_argument('key', help="ключ (для record-outcome - код выхода)")
+    parser.add_argument('value', nargs='?')
+    args = parser.parse_args()
+
+    store = StateStore()
+    if args.command == 'get':
+        print(store.get(args.key, ''))
+    elif args.command == 'set':
+        store.set(args.key, args.value)
+    elif args.command == 'set-now':
+        store.set(args.key, datetime.now().isoformat())
+    elif args.command == 'record-outcome':
+        store.record_claude_outcome(args.key == '0')
+    store.close()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+📜 Structured Log - общие JSONL логи компонентов с ротацией
+
+Записи уходят в очередь, на диск их пишет фоновый поток, так что логирование
+не тормозит действия. Файлы: logs/<component>.jsonl (+ .1 ... .5 при ротации),
+папка не зависит от текущего каталога (LIFE_LOG_DIR переопределяет).
+
+В один файл пишут несколько процессов (разовые запуски, демон, CLI), поэтому
+сами они не ротируют: WatchedFileHandler переоткрывает файл после переименования,
+а ротирует rotate_logs() под файловой блокировкой - её зовёт оркестратор.
+
+Поиск по логам:
+
+    python3 autonomy/structured_log.py --component orchestrator --action check_messages --since 2h
+"""
+
+import argparse
+import atexit
+import fcntl
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+from pathlib import Path
+
+LOG_DIR = Path(os.environ.get('LIFE_LOG_DIR', Path(__file__).resolve().parent.parent / 'logs'))
+# Ротация по размеру: до 5 МБ на файл, 5 старых копий на компонент
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 5
+
+_context = threading.local()
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, component):
+        super().__init__()
+        self.component = component
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'component': self.component,
+            'message': record.getMessage(),
+        }
+        action = getattr(record, 'action', None)
+        if action:
+            entry['action'] = action
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class ContextFilter(logging.Filter):
+    """Подписывает запись текущим действием потока (в потоке вызова, до очереди)"""
+
+    def filter(self, record):
+        if not hasattr(record, 'action'):
+            record.action = getattr(_context, 'action', None)
+        return True
+
+
+@contextmanager
+def log_context(action):
+    """Все записи внутри блока получают поле action"""
+    previous = getattr(_context, 'action', None)
+    _context.action = action
+    try:
+        yield
+    finally:
+        _context.action = previous
+
+
+def setup_logging(component, level=logging.INFO):
+    """Настраивает корневой логгер процесса (повторные вызовы ничего не меняют)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    file_handler = WatchedFileHandler(LOG_DIR / f"{component}.jsonl", encoding='utf-8')
+    file_handler.setFormatter(JsonFormatter(component))
+
+    records = queue.SimpleQueue()
+    queue_handler = QueueHandler(records)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(records, file_handler)
+    _listener.start()
+    # Дописываем хвост очереди при выходе
+    atexit.register(_listener.stop)
+
+
+def rotate_logs(max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+    """Ротирует разросшиеся logs/*.jsonl, возвращает имена ротированных
+
+    Размер проверяется под блокировкой, так что два процесса не сдвинут копии
+    дважды. Писатели заметят переименование и откроют новый файл сами.
+    """
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    rotated = []
+    with open(LOG_DIR / '.rotate.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        for path in sorted(LOG_DIR.glob('*.jsonl')):
+            if path.stat().st_size < max_bytes:
+                continue
+            for n in range(backup_count - 1, 0, -1):
+                older = path.with_name(f"{path.name}.{n}")
+                if older.exists():
+                    os.replace(older, path.with_name(f"{path.name}.{n + 1}"))
+            os.replace(path, path.with_name(f"{path.name}.1"))
+            rotated.append(path.name)
+    return rotated
+
+
+def parse_time(value):
+    """ISO время или относительное: 30m, 2h, 1d"""
+    match = re.fullmatch(r'(\d+)([smhd])', value)
+    if match:
+        unit = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days'}[match.group(2)]
+        return datetime.now() - timedelta(**{unit: int(match.group(1))})
+    return datetime.fromisoformat(value)
+
+
+def log_files(component=None):
+    """Файлы логов, старые копии первыми"""
+    pattern = f"{component}.jsonl*" if component else "*.jsonl*"
+    def age(path):
+        suffix = path.name.rsplit('.', 1)[-1]
+        return -int(suffix) if suffix.isdigit() else 0
+    return sorted(LOG_DIR.glob(pattern), key=lambda p: (age(p), p.name))
+
+
+def query(component=None, action=None, level=None, since=None, until=None, text=None):
+    """Записи логов по фильтрам, по времени"""
+    since_ts = since.isoformat() if since else None
+    until_ts = until.isoformat() if until else None
+    entries = []
+    for path in log_files(component):
+        with open(path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if action and entry.get('action') != action:
+                    continue
+                if level and entry['level'] != level:
+                    continue
+                if since_ts and entry['ts'] < since_ts:
+                    continue
+                if until_ts and entry['ts'] > until_ts:
+                    continue
+                if text and text.lower() not in entry['message'].lower():
+                    continue
+                entries.append(entry)
+    entries.sort(key=lambda entry: entry['ts'])
+    return entries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Поиск по логам Клэр")
+    parser.add_argument('--component', help="orchestrator, health_monitor, watchdog")
+    parser.add_argument('--action', help="действие оркестратора")
+    parser.add_argument('--level', help="INFO, WARNING, ERROR")
+    parser.add_argument('--since', type=parse_time, help="с какого момента (ISO или 30m/2h/1d)")
+    parser.add_argument('--until', type=parse_time, help="до какого момента")
+    parser.add_argument('--grep', dest='text', help="подстрока в сообщении")
+    parser.add_argument('--tail', type=int, help="только последние N записей")
+    parser.add_argument('--json', action='store_true', help="выводить как JSONL")
+    parser.add_argument('--rotate', action='store_true', help="ротировать разросшиеся логи и выйти")
+    args = parser.parse_args()
+
+    if args.rotate:
+        for name in rotate_logs():
+            print(f"ротирован {name}")
+        sys.exit(0)
+
+    entries = query(args.component, args.action, args.level, args.since, args.until, args.text)
+    if args.tail:
+        entries = entries[-args.tail:]
+    for entry in entries:
+        if args.json:
+            print(json.dumps(entry, ensure_ascii=False))
+        else:
+            action = f" [{entry['action']}]" if entry.get('action') else ""
+            print(f"{entry['ts']} {entry['level']:7} {entry['component']}{action}: {entry['message']}")
+    sys.exit(0 if entries else 1)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+📨 Telegram Client - прямая связь с Telegram, когда Claude недоступен
+
+Клиент создаётся один раз на процесс (get_client) и держит соединение
+открытым. Реализации:
+- bot - Bot API по HTTP keep-alive, getUpdates пачками со смещением;
+- mcp - функции telegram_live_mcp напрямую (старый способ).
+
+TELEGRAM_API_BASE позволяет направить Bot API на локальный сервер-заглушку.
+"""
+
+import http.client
+import json
+import logging
+import os
+import sys
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from metrics import REGISTRY as metrics
+
+DEFAULT_API_BASE = 'https://api.telegram.org'
+# Токен бота берём из окружения или из .env соседнего TG_MCP
+DEFAULT_ENV_FILE = Path(__file__).resolve().parents[2] / 'TG_MCP' / '.env'
+DEFAULT_MCP_SRC = Path(__file__).resolve().parents[2] / 'TG_MCP' / 'src'
+# getUpdates: размер пачки и сколько пачек забирать за один вызов
+UPDATES_LIMIT = 100
+MAX_UPDATE_PAGES = 5
+REQUEST_TIMEOUT = 10
+
+
+class TelegramError(Exception):
+    pass
+
+
+class TelegramClient:
+    """Интерфейс клиента: сообщения приходят как словари
+    {'update_id', 'chat_id', 'user_id', 'text', 'date'}"""
+
+    def get_updates(self):
+        raise NotImplementedError
+
+    def send_message(self, chat_id, text):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class BotApiClient(TelegramClient):
+    def __init__(self, token, api_base=DEFAULT_API_BASE, store=None, timeout=REQUEST_TIMEOUT):
+        parsed = urlsplit(api_base)
+        self.secure = parsed.scheme == 'https'
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.prefix = f"{parsed.path.rstrip('/')}/bot{token}"
+        self.store = store
+        self.timeout = timeout
+        self.conn = None
+        self.lock = threading.Lock()
+        self.offset = store.get('telegram.update_offset') if store else None
+
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def call(self, method, **params):
+        """Вызов метода Bot API по постоянному соединению"""
+        body = json.dumps(params).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'Connection': 'keep-alive'}
+        with self.lock:
+            # Сервер мог закрыть простаивающее соединение - одна попытка переподключиться
+            for attempt in (1, 2):
+                if self.conn is None:
+                    self.conn = self._connect()
+                try:
+                    self.conn.request('POST', f"{self.prefix}/{method}", body, headers)
+                    response = self.conn.getresponse()
+                    payload = json.loads(response.read() or b'{}')
+                    break
+                except (http.client.HTTPException, OSError, ValueError):
+                    self.conn.close()
+                    self.conn = None
+                    if attempt == 2:
+                        metrics.inc('life_telegram_requests_total', {'method': method, 'result': 'error'},
+                                    help="Прямые запросы к Telegram Bot API")
+                        raise
+
+        ok = bool(payload.get('ok'))
+        metrics.inc('life_telegram_requests_total', {'method': method, 'result': 'ok' if ok else 'error'},
+                    help="Прямые запросы к Telegram Bot API")
+        if not ok:
+            raise TelegramError(payload.get('description', f"{method} failed"))
+        return payload['result']
+
+    def get_updates(self):
+        """Новые сообщения; смещение сохраняется, чтобы не получать их повторно"""
+        messages = []
+        for _ in range(MAX_UPDATE_PAGES):
+            params = {'limit': UPDATES_LIMIT, 'timeout': 0, 'allowed_updates': ['message']}
+            if self.offset is not None:
+                params['offset'] = self.offset
+            updates = self.call('getUpdates', **params)
+            if not updates:
+                break
+
+            for update in updates:
+                self.offset = update['update_id'] + 1
+                message = update.get('message')
+                if message:
+                    messages.append(self._parse_message(update['update_id'], message))
+            if self.store:
+                self.store.set('telegram.update_offset', self.offset)
+            if len(updates) < UPDATES_LIMIT:
+                break
+        return messages
+
+    def _parse_message(self, update_id, message):
+        text = message.get('text') or message.get('caption')
+        if not text:
+            kinds = [kind for kind in ('voice', 'photo', 'sticker', 'document') if kind in message]
+            text = f"[{kinds[0] if kinds else 'сообщение'}]"
+        return {
+            'update_id': update_id,
+            'chat_id': message['chat']['id'],
+            'user_id': message.get('from', {}).get('id', message['chat']['id']),
+            'text': text,
+            'date': message.get('date'),
+        }
+
+    def send_message(self, chat_id, text):
+        self.call('sendMessage', chat_id=chat_id, text=text)
+        return True
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+class McpBridgeClient(TelegramClient):
+    """Функции telegram_live_mcp, импортированные один раз"""
+
+    def __init__(self, src=None):
+        src = str(src or os.environ.get('TG_MCP_SRC', DEFAULT_MCP_SRC))
+        if src not in sys.path:
+            sys.path.append(src)
+        from telegram_live_mcp.server import check_telegram_messages, send_telegram_message
+        self._check = check_telegram_messages
+        self._send = send_telegram_message
+
+    def get_updates(self):
+        result = self._check(transcribe_audio=True, include_context=True)
+        messages = []
+        for message in (result or {}).get('new_messages', []):
+            chat_id = message.get('chat_id') or message.get('user_id')
+            messages.append({
+                'update_id': message.get('message_id') or message.get('id'),
+                'chat_id': chat_id,
+                'user_id': message.get('user_id') or chat_id,
+                'text': message.get('text', ''),
+                'date': message.get('date'),
+            })
+        return messages
+
+    def send_message(self, chat_id, text):
+        self._send(chat_id, text)
+        return True
+
+
+def load_bot_token(env_file=None):
+    """BOT_TOKEN из окружения или из .env файла TG_MCP"""
+    token = os.environ.get('BOT_TOKEN')
+    if token:
+        return token
+    path = Path(env_file or os.environ.get('TG_MCP_ENV', DEFAULT_ENV_FILE))
+    if not path.exists():
+        return None
+    for line in path.read_text().splitlines():
+        key, _, value = line.partition('=')
+        if key.strip() == 'BOT_TOKEN':
+            return value.strip().strip('"\'')
+    return None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client(store=None):
+    """Общий клиент процесса (None, если связаться с Telegram нечем)
+
+    TELEGRAM_CLIENT=bot|mcp выбирает реализацию явно, по умолчанию - Bot API,
+    если найден токен, иначе мост MCP.
+    """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            return _client
+
+        kind = os.environ.get('TELEGRAM_CLIENT')
+        token = load_bot_token()
+        try:
+            if kind == 'bot' or (kind is None and token):
+                if not token:
+                    raise TelegramError("BOT_TOKEN не найден")
+                _client = BotApiClient(token, os.environ.get('TELEGRAM_API_BASE', DEFAULT_API_BASE), store)
+            else:
+                _client = McpBridgeClient()
+        except Exception as e:
+            logging.error(f"Telegram клиент недоступен: {str(e)}")
+            return None
+        return _client
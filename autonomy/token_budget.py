@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+🪙 Token Budget - оценка размера промптов и обрезка контекста по приоритетам
+
+Промпт собирается из частей с приоритетами: 0 - сама задача (не режется),
+чем больше число - тем раньше часть обрезается при превышении бюджета.
+"""
+
+from metrics import REGISTRY as metrics
+
+# Грубая оценка: ~4 байта UTF-8 на токен (кириллица - около 2 символов)
+BYTES_PER_TOKEN = 4
+# Бюджеты промптов по действиям (токены)
+BUDGETS = {
+    'check_messages': 6000,
+    'proactive_message': 3000,
+    'proactive_care': 3000,
+    'deep_thinking': 4000,
+    'analyze_patterns': 6000,
+    'update_portrait': 6000,
+    'batch': 16000,
+}
+DEFAULT_BUDGET = 4000
+# Гистограммы размеров промптов (токены)
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+TRIM_MARK = "\n…"
+
+
+def estimate_tokens(text):
+    """Оценка числа токенов без токенизатора"""
+    return -(-len(text.encode('utf-8')) // BYTES_PER_TOKEN)
+
+
+def record_usage(action, tokens, trimmed=0):
+    """Размер промпта и обрезанные токены - в метрики по действию"""
+    labels = {'action': action}
+    metrics.observe('life_prompt_tokens', tokens, labels, buckets=TOKEN_BUCKETS,
+                    help="Оценка размера промпта в токенах")
+    if trimmed:
+        metrics.inc('life_prompt_trimmed_tokens_total', labels, value=trimmed,
+                    help="Токены контекста, обрезанные по бюджету")
+
+
+class PromptBudget:
+    def __init__(self, action, budget=None):
+        self.action = action
+        self.budget = budget or BUDGETS.get(action, DEFAULT_BUDGET)
+        self.parts = []  # [priority, text]
+
+    def add(self, text, priority=0):
+        if text:
+            self.parts.append([priority, text])
+
+    def tokens(self):
+        return sum(estimate_tokens(text) for _, text in self.parts)
+
+    def render(self):
+        """Собирает промпт в пределах бюджета и отчитывается в метрики"""
+        total = self.tokens()
+        over = total - self.budget
+        trimmed = 0
+
+        # Сначала наименее важные; при равном приоритете - добавленные позже
+        order = sorted(range(len(self.parts)), key=lambda i: (self.parts[i][0], i), reverse=True)
+        for i in order:
+            if over <= 0:
+                break
+            priority, text = self.parts[i]
+            if priority == 0:
+                break
+            size = estimate_tokens(text)
+            if size <= over:
+                self.parts[i][1] = ''
+                over -= size
+                trimmed += size
+            else:
+                # Оставляем начало части, сколько влезает
+                keep = max(0, (size - over) * BYTES_PER_TOKEN - len(TRIM_MARK.encode('utf-8')))
+                cut = text.encode('utf-8')[:keep].decode('utf-8', errors='ignore').rstrip()
+                self.parts[i][1] = cut + TRIM_MARK if cut else ''
+                trimmed += size - estimate_tokens(self.parts[i][1])
+                over = 0
+
+        prompt = ''.join(text for _, text in self.parts)
+        record_usage(self.action, estimate_tokens(prompt), trimmed)
+        return prompt
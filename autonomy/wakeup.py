@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+🔔 Wakeup - сигнал оркестратору о новом сообщении в Telegram
+
+Вызывается Telegram мостом (или вручную/в тестах вместо моста):
+
+    python3 autonomy/wakeup.py --user 365991821
+
+Код выхода 1 - резидентный оркестратор не запущен, сообщение подхватит опрос.
+"""
+
+import argparse
+import sys
+import time
+
+from control_socket import send_command
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Разбудить оркестратор")
+    parser.add_argument('--user', help="ID пользователя, который написал")
+    parser.add_argument('--repeat', type=int, default=1, help="сколько сигналов отправить")
+    parser.add_argument('--interval', type=float, default=1.0, help="пауза между сигналами, с")
+    args = parser.parse_args()
+
+    ok = True
+    for i in range(args.repeat):
+        reply = send_command('WAKE', *([args.user] if args.user else []))
+        if not reply or not reply.get('ok'):
+            ok = False
+            print("Оркестратор не отвечает", file=sys.stderr)
+            break
+        print(f"queued={reply.get('queued')} recheck={reply.get('recheck')}")
+        if i + 1 < args.repeat:
+            time.sleep(args.interval)
+
+    sys.exit(0 if ok else 1)
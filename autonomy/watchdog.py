@@ -4,123 +4,46 @@
 Следит за критическими сбоями и перезапускает систему
 """
 
-import time
 import subprocess
 import logging
 from datetime import datetime, timedelta
-from pathlib import Path
 
-logging.basicConfig(
-    filename='logs/watchdog.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+from failover import FailoverManager
+from metrics import export as export_metrics
+from state_store import StateStore
+from structured_log import setup_logging
+
+setup_logging('watchdog')
 
 class Watchdog:
     def __init__(self):
-        self.last_success_file = Path("state/last_success.txt")
-        self.crash_count_file = Path("state/crash_count.txt")
-        self.max_crashes = 3
-        self.reset_period = 3600  # Сброс счетчика через час
+        self.store = StateStore()
+        self.failover = FailoverManager(self.store)
         
     def check_last_success(self):
         """Проверяет время последней успешной операции"""
-        if not self.last_success_file.exists():
-            return None
-            
         try:
-            with open(self.last_success_file, 'r') as f:
-                last_time = datetime.fromisoformat(f.read().strip())
-                return last_time
-        except:
+            last_time = self.store.get('watchdog.last_success')
+            return datetime.fromisoformat(last_time) if last_time else None
+        except ValueError:
             return None
     
     def update_success_time(self):
         """Обновляет время последней успешной операции"""
-        self.last_success_file.parent.mkdir(exist_ok=True)
-        with open(self.last_success_file, 'w') as f:
-            f.write(datetime.now().isoformat())
-    
-    def get_crash_count(self):
-        """Получает счетчик сбоев"""
-        if not self.crash_count_file.exists():
-            return 0
-        
-        try:
-            with open(self.crash_count_file, 'r') as f:
-                data = f.read().strip().split('\n')
-                count = int(data[0])
-                first_crash = datetime.fromisoformat(data[1])
-                
-                # Сбрасываем счетчик если прошло много времени
-                if datetime.now() - first_crash > timedelta(seconds=self.reset_period):
-                    self.reset_crash_count()
-                    return 0
-                    
-                return count
-        except:
-            return 0
-    
-    def increment_crash_count(self):
-        """Увеличивает счетчик сбоев"""
-        count = self.get_crash_count()
-        
-        with open(self.crash_count_file, 'w') as f:
-            if count == 0:
-                # Первый сбой - записываем время
-                f.write(f"1\n{datetime.now().isoformat()}")
-            else:
-                # Увеличиваем счетчик, сохраняем время первого сбоя
-                with open(self.crash_count_file, 'r') as rf:
-                    lines = rf.read().strip().split('\n')
-                    first_crash = lines[1] if len(lines) > 1 else datetime.now().isoformat()
-                f.write(f"{count + 1}\n{first_crash}")
-    
-    def reset_crash_count(self):
-        """Сбрасывает счетчик сбоев"""
-        if self.crash_count_file.exists():
-            self.crash_count_file.unlink()
+        self.store.set('watchdog.last_success', datetime.now().isoformat())
     
     def perform_recovery(self):
-        """Выполняет восстановление системы"""
-        crash_count = self.get_crash_count()
-        
-        if crash_count >= self.max_crashes:
-            logging.error(f"Слишком много сбоев ({crash_count}), требуется вмешательство")
-            # Можно отправить уведомление через Telegram
-            return False
-        
-        logging.info(f"Попытка восстановления #{crash_count + 1}")
-        self.increment_crash_count()
-        
-        try:
-            # Жесткий перезапуск
-            subprocess.run(['pkill', '-9', '-f', 'claude'], capture_output=True)
-            time.sleep(3)
-            
-            # Запускаем заново
-            result = subprocess.run(
-                ['./start', '--force', '--quiet'],
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
-            
-            if result.returncode == 0:
-                logging.info("Система восстановлена")
-                self.update_success_time()
-                return True
-            else:
-                logging.error(f"Не удалось восстановить: {result.stderr}")
-                return False
-                
-        except Exception as e:
-            logging.error(f"Ошибка восстановления: {str(e)}")
-            return False
+        """Восстанавливает сессию через резерв (с паузами и размыканием цепи)"""
+        if self.failover.recover('watchdog'):
+            self.update_success_time()
+            return True
+        return False
     
     def monitor(self):
         """Основной цикл мониторинга"""
         last_success = self.check_last_success()
+        # Резервная сессия должна быть готова до сбоя, а не после
+        self.failover.ensure_standby()
         
         if last_success:
             time_since = datetime.now() - last_success
@@ -146,4 +69,6 @@ class Watchdog:
 
 if __name__ == "__main__":
     watchdog = Watchdog()
-    watchdog.monitor()
\ No newline at end of file
+    watchdog.monitor()
+    # Восстановления из этого процесса - в общие метрики
+    export_metrics(watchdog.store)
\ No newline at end of file